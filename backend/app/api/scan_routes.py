@@ -2,11 +2,13 @@
 Scan-related API endpoints
 """
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from typing import Optional
+from typing import Optional, List, Dict
+import asyncio
 import logging
 from datetime import datetime
-import io
+import numpy as np
 
+from app.config import settings
 from app.vision.clip_service import vision_service
 from app.voice.whisper_service import voice_service
 from app.osm.osm_service import osm_service
@@ -25,13 +27,103 @@ from app.services.database import (
 )
 from app.models.scan_models import PendingItemModel
 from bson import ObjectId
-import imagehash
-from PIL import Image
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def estimate_item_weight(material: str, raw_detection: str = "") -> float:
+    """Estimate weight in kg based on material and what CLIP detected"""
+    # Check raw detection for specific items
+    detection_lower = raw_detection.lower()
+    
+    # Specific item weights
+    if "bottle" in detection_lower:
+        if "glass" in detection_lower:
+            return 0.3  # Glass bottle ~300g
+        else:
+            return 0.03  # Plastic bottle ~30g
+    elif "can" in detection_lower:
+        if "aluminum" in detection_lower:
+            return 0.015  # Aluminum can ~15g
+        else:
+            return 0.05  # Steel can ~50g
+    elif "cardboard box" in detection_lower:
+        return 0.2  # Small box ~200g
+    elif "battery" in detection_lower:
+        return 0.05  # AA battery ~50g
+    elif "electronic" in detection_lower or "headphone" in detection_lower:
+        return 0.1  # Small electronics ~100g
+    
+    # Material-based defaults (for when specific item not detected)
+    material_weights = {
+        "PET": 0.03,  # Plastic bottle
+        "HDPE": 0.05,  # Plastic container
+        "Plastic": 0.05,  # Generic plastic
+        "Paper": 0.01,  # Single sheet
+        "Cardboard": 0.15,  # Box
+        "Glass": 0.3,  # Bottle
+        "Aluminum": 0.015,  # Can
+        "Steel": 0.05,  # Can
+        "E-Waste": 0.15,  # Small device
+        "Organic/Bio Waste": 0.1,  # Fruit peel
+        "Textile": 0.2,  # Cloth item
+        "Mixed Waste": 0.1,  # Generic
+    }
+    
+    return material_weights.get(material, 0.1)  # Default 100g
+
+
+async def translate_output(text: str, language: str) -> str:
+    """Translate English LLM output to the user's language via Bhashini"""
+    if language == "hi":
+        # Use Bhashini for high-quality Indian language translation
+        logger.info("Translating output to Hindi using Bhashini")
+        return await bhashini_service.translate_with_fallback(
+            text=text,
+            source_language="en",
+            target_language="hi"
+        )
+    elif language in ["pa", "bn", "ta", "te", "mr", "gu", "kn", "ml", "or", "as"]:
+        # Support for other Indian languages via Bhashini
+        logger.info(f"Translating output to {language} using Bhashini")
+        return await bhashini_service.translate_with_fallback(
+            text=text,
+            source_language="en",
+            target_language=language
+        )
+    
+    return text
+
+
+async def fetch_recycler_details(recycler_ranking: List) -> List[Dict]:
+    """Full recycler documents for the top 3 ranked recyclers"""
+    recyclers_collection = get_recyclers_collection()
+    recycler_response = []
+    
+    for r in recycler_ranking[:3]:
+        # Get full recycler document
+        recycler_doc = await recyclers_collection.find_one({"_id": ObjectId(r.recycler_id)})
+        
+        if recycler_doc:
+            recycler_response.append({
+                "recycler_id": r.recycler_id,
+                "name": r.recycler_name,
+                "phone": recycler_doc.get("phone"),
+                "address": recycler_doc.get("address"),
+                "distance_km": r.distance_km,
+                "estimated_travel_time_min": r.estimated_travel_time_min,
+                "total_score": r.total_score,
+                "rating": recycler_doc.get("rating"),
+                "operating_hours": recycler_doc.get("operating_hours"),
+                "materials_accepted": recycler_doc.get("materials_accepted", []),
+                "location": r.location,  # Already a dict with type and coordinates
+                "route_summary": r.route_summary
+            })
+    
+    return recycler_response
+
+
 @router.post("/scan_image")
 async def scan_image(
     user_id: str = Form(...),
@@ -64,9 +156,11 @@ async def scan_image(
         # ==========================================
         # STEP 2: Vision Module (CLIP)
         # ==========================================
-        vision_prediction = await vision_service.zero_shot_classification(image_bytes)
+        # Decode once: CLIP tensor + image hash share one PIL decode
+        prepared_image = await vision_service.prepare_image(image_bytes)
         
-        v_img = await vision_service.encode_image(image_bytes)
+        # Single image forward pass: classification heads + v_img
+        vision_prediction, v_img = await vision_service.classify_and_encode(prepared_image)
         
         material = vision_prediction["material"]
         cleanliness_score = vision_prediction["cleanliness_score"]
@@ -133,7 +227,8 @@ async def scan_image(
             query_embedding=v_fused,
             global_top_k=5,
             personal_top_k=3,
-            city=osm_context.get("city")
+            city=osm_context.get("city"),
+            query_text=f"{material} {query_en}"
         )
         
         logger.info(f"RAG: global={len(global_docs)}, personal={len(personal_docs)}")
@@ -142,48 +237,6 @@ async def scan_image(
         # STEP 8: LLM Reasoning (English only)
         # ==========================================
         
-        # Estimate realistic weight based on material type
-        def estimate_item_weight(material: str, raw_detection: str = "") -> float:
-            """Estimate weight in kg based on material and what CLIP detected"""
-            # Check raw detection for specific items
-            detection_lower = raw_detection.lower()
-            
-            # Specific item weights
-            if "bottle" in detection_lower:
-                if "glass" in detection_lower:
-                    return 0.3  # Glass bottle ~300g
-                else:
-                    return 0.03  # Plastic bottle ~30g
-            elif "can" in detection_lower:
-                if "aluminum" in detection_lower:
-                    return 0.015  # Aluminum can ~15g
-                else:
-                    return 0.05  # Steel can ~50g
-            elif "cardboard box" in detection_lower:
-                return 0.2  # Small box ~200g
-            elif "battery" in detection_lower:
-                return 0.05  # AA battery ~50g
-            elif "electronic" in detection_lower or "headphone" in detection_lower:
-                return 0.1  # Small electronics ~100g
-            
-            # Material-based defaults (for when specific item not detected)
-            material_weights = {
-                "PET": 0.03,  # Plastic bottle
-                "HDPE": 0.05,  # Plastic container
-                "Plastic": 0.05,  # Generic plastic
-                "Paper": 0.01,  # Single sheet
-                "Cardboard": 0.15,  # Box
-                "Glass": 0.3,  # Bottle
-                "Aluminum": 0.015,  # Can
-                "Steel": 0.05,  # Can
-                "E-Waste": 0.15,  # Small device
-                "Organic/Bio Waste": 0.1,  # Fruit peel
-                "Textile": 0.2,  # Cloth item
-                "Mixed Waste": 0.1,  # Generic
-            }
-            
-            return material_weights.get(material, 0.1)  # Default 100g
-        
         weight_estimate = estimate_item_weight(
             material, 
             vision_prediction.get("raw_detection", "")
@@ -227,33 +280,17 @@ async def scan_image(
         # ==========================================
         # STEP 9: Final Output Translation (Bhashini)
         # ==========================================
-        output_text = llm_response.get("disposal_instruction", "")
-        
-        if language == "hi":
-            # Use Bhashini for high-quality Indian language translation
-            logger.info("Translating output to Hindi using Bhashini")
-            translated_text = await bhashini_service.translate_with_fallback(
-                text=output_text,
-                source_language="en",
-                target_language="hi"
-            )
-            output_text = translated_text
-        elif language in ["pa", "bn", "ta", "te", "mr", "gu", "kn", "ml", "or", "as"]:
-            # Support for other Indian languages via Bhashini
-            logger.info(f"Translating output to {language} using Bhashini")
-            translated_text = await bhashini_service.translate_with_fallback(
-                text=output_text,
-                source_language="en",
-                target_language=language
-            )
-            output_text = translated_text
+        output_text = await translate_output(
+            llm_response.get("disposal_instruction", ""),
+            language
+        )
         
         # ==========================================
         # STEP 10: Backend Updates
         # ==========================================
         
-        # Compute image hash
-        img_hash = str(imagehash.average_hash(Image.open(io.BytesIO(image_bytes))))
+        # Image hash from the shared preprocessing stage
+        img_hash = prepared_image.average_hash
         
         # Create pending item
         pending_item = PendingItemModel(
@@ -349,28 +386,7 @@ async def scan_image(
         # ==========================================
         
         # Fetch full recycler details from DB
-        recyclers_collection = get_recyclers_collection()
-        recycler_response = []
-        
-        for r in recycler_ranking[:3]:
-            # Get full recycler document
-            recycler_doc = await recyclers_collection.find_one({"_id": ObjectId(r.recycler_id)})
-            
-            if recycler_doc:
-                recycler_response.append({
-                    "recycler_id": r.recycler_id,
-                    "name": r.recycler_name,
-                    "phone": recycler_doc.get("phone"),
-                    "address": recycler_doc.get("address"),
-                    "distance_km": r.distance_km,
-                    "estimated_travel_time_min": r.estimated_travel_time_min,
-                    "total_score": r.total_score,
-                    "rating": recycler_doc.get("rating"),
-                    "operating_hours": recycler_doc.get("operating_hours"),
-                    "materials_accepted": recycler_doc.get("materials_accepted", []),
-                    "location": r.location,  # Already a dict with type and coordinates
-                    "route_summary": r.route_summary
-                })
+        recycler_response = await fetch_recycler_details(recycler_ranking)
         
         return {
             "scan_id": scan_id,
@@ -400,6 +416,312 @@ async def scan_image(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/scan_images_batch")
+async def scan_images_batch(
+    user_id: str = Form(...),
+    images: List[UploadFile] = File(...),
+    latitude: float = Form(...),
+    longitude: float = Form(...),
+    query_text: Optional[str] = Form(None),
+    language: str = Form("en")
+):
+    """
+    Multi-item scan: N images from one user at one location
+    
+    Location, user and time context, the query embedding and RAG retrieval
+    are computed once for the batch; CLIP runs batched and all pending items
+    are written with a single insert_many.
+    """
+    if not images:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    
+    if len(images) > settings.SCAN_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SCAN_BATCH_MAX_IMAGES} images per batch"
+        )
+    
+    try:
+        logger.info(f"Batch scan request from user {user_id} with {len(images)} images")
+        
+        image_bytes_list = await asyncio.gather(*[image.read() for image in images])
+        
+        # ==========================================
+        # STEP 1: Input Normalization (once)
+        # ==========================================
+        query_en = query_text or ""
+        
+        if language == "hi" and query_en:
+            query_en = await llm_service.translate_to_english(query_en)
+        
+        # ==========================================
+        # STEP 2: Vision Module (batched CLIP)
+        # ==========================================
+        prepared_images = await asyncio.gather(
+            *[vision_service.prepare_image(image_bytes) for image_bytes in image_bytes_list]
+        )
+        vision_results = await vision_service.classify_and_encode_many(prepared_images)
+        
+        logger.info(f"Vision: {[prediction['material'] for prediction, _ in vision_results]}")
+        
+        # ==========================================
+        # STEP 3-5: Shared OSM, Personal and Time Context
+        # ==========================================
+        user_behavior_collection = get_user_behavior_collection()
+        
+        osm_context, road_difficulty, nearby_recyclers_osm, user_behavior = await asyncio.gather(
+            osm_service.reverse_geocode(latitude, longitude),
+            osm_service.get_road_difficulty(latitude, longitude),
+            osm_service.find_nearby_recyclers(latitude, longitude),
+            user_behavior_collection.find_one({"user_id": ObjectId(user_id)})
+        )
+        
+        v_loc = fusion_service.create_location_features(osm_context, road_difficulty)
+        
+        logger.info(f"OSM: ward={osm_context.get('ward')}, nearby={len(nearby_recyclers_osm)}")
+        
+        recent_scans_count = len(user_behavior.get("recent_scans", [])) if user_behavior else 0
+        avg_cleanliness = user_behavior.get("average_cleanliness_score", 0.0) if user_behavior else 0.0
+        
+        v_user = fusion_service.create_user_features(user_behavior, recent_scans_count, avg_cleanliness)
+        
+        now = datetime.utcnow()
+        hour = now.hour
+        day_of_week = now.weekday()
+        is_weekend = day_of_week >= 5
+        
+        v_time = fusion_service.create_time_features(hour, day_of_week, is_weekend)
+        
+        # ==========================================
+        # STEP 6: Fusion Layer (per item)
+        # ==========================================
+        v_text = await vision_service.encode_text(query_en) if query_en else None
+        
+        fused = await asyncio.gather(*[
+            fusion_service.fuse(
+                v_img=v_img,
+                v_text=v_text,
+                v_loc=v_loc,
+                v_user=v_user,
+                v_time=v_time
+            )
+            for _, v_img in vision_results
+        ])
+        
+        # ==========================================
+        # STEP 7: Dual-RAG Retrieval (once, on the batch centroid)
+        # ==========================================
+        centroid = np.mean(np.stack(fused), axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm > 0:
+            centroid = centroid / norm
+        
+        global_docs, personal_docs = await rag_service.dual_retrieve(
+            user_id=user_id,
+            query_embedding=centroid,
+            global_top_k=5,
+            personal_top_k=3,
+            city=osm_context.get("city"),
+            query_text=" ".join([*sorted({prediction["material"] for prediction, _ in vision_results}), query_en])
+        )
+        
+        logger.info(f"RAG: global={len(global_docs)}, personal={len(personal_docs)}")
+        
+        # ==========================================
+        # STEP 8-9: LLM Reasoning + Translation (per item, concurrent)
+        # ==========================================
+        rankings: Dict[str, asyncio.Task] = {}
+        
+        async def reason_about_item(vision_prediction: Dict):
+            material = vision_prediction["material"]
+            weight_estimate = estimate_item_weight(
+                material,
+                vision_prediction.get("raw_detection", "")
+            )
+            
+            # Items of the same material share one recycler ranking
+            if material not in rankings:
+                rankings[material] = asyncio.ensure_future(marketplace_service.rank_recyclers(
+                    user_lat=latitude,
+                    user_lon=longitude,
+                    material=material,
+                    weight_kg=weight_estimate,
+                    ward=osm_context.get("ward")
+                ))
+            recycler_ranking = await rankings[material]
+            
+            recycler_info = [
+                {
+                    "name": r.recycler_name,
+                    "distance_km": r.distance_km,
+                    "total_score": r.total_score
+                }
+                for r in recycler_ranking[:3]
+            ]
+            
+            llm_response = await llm_service.reason_about_waste(
+                query=query_en or vision_prediction.get("detailed_description", f"How to dispose {material}?"),
+                vision_labels=vision_prediction,
+                osm_context=osm_context,
+                global_docs=global_docs,
+                personal_docs=personal_docs,
+                recycler_info=recycler_info,
+                material=material,
+                weight_estimate=weight_estimate
+            )
+            
+            output_text = await translate_output(
+                llm_response.get("disposal_instruction", ""),
+                language
+            )
+            
+            return llm_response, output_text, recycler_ranking
+        
+        reasoned = await asyncio.gather(
+            *[reason_about_item(prediction) for prediction, _ in vision_results]
+        )
+        
+        logger.info("LLM reasoning complete")
+        
+        # ==========================================
+        # STEP 10: Backend Updates (one write per collection)
+        # ==========================================
+        location = {
+            "type": "Point",
+            "coordinates": [longitude, latitude]
+        }
+        
+        pending_docs = [
+            PendingItemModel(
+                user_id=ObjectId(user_id),
+                image_hash=prepared.average_hash,
+                query_text=query_text,
+                query_language=language,
+                location=location,
+                osm_context=osm_context,
+                vision_prediction=vision_prediction,
+                llm_response=llm_response,
+                scan_hour=hour,
+                scan_day=now.strftime("%A")
+            ).model_dump(by_alias=True, exclude=["id"])
+            for prepared, (vision_prediction, _), (llm_response, _, _)
+            in zip(prepared_images, vision_results, reasoned)
+        ]
+        
+        pending_collection = get_pending_items_collection()
+        result = await pending_collection.insert_many(pending_docs)
+        scan_ids = [str(inserted_id) for inserted_id in result.inserted_ids]
+        
+        count = len(scan_ids)
+        updated_at = datetime.utcnow()
+        
+        users_collection = get_users_collection()
+        await users_collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {
+                "$inc": {"total_scans": count},
+                "$set": {"updated_at": updated_at}
+            }
+        )
+        
+        scan_summaries = [
+            {
+                "scan_id": scan_id,
+                "material": vision_prediction["material"],
+                "cleanliness_score": vision_prediction["cleanliness_score"],
+                "timestamp": updated_at,
+                "location": location
+            }
+            for scan_id, (vision_prediction, _) in zip(scan_ids, vision_results)
+        ]
+        
+        await user_behavior_collection.update_one(
+            {"user_id": ObjectId(user_id)},
+            {
+                "$push": {
+                    "recent_scans": {
+                        "$each": scan_summaries,
+                        "$slice": -50  # Keep only last 50 scans
+                    }
+                },
+                "$inc": {"total_scans": count},
+                "$set": {
+                    "updated_at": updated_at,
+                    "last_scan_at": updated_at
+                }
+            },
+            upsert=True
+        )
+        
+        zoom, x, y = osm_service.lat_lon_to_tile(latitude, longitude, zoom=15)
+        tile_id = f"{zoom}_{x}_{y}"
+        
+        heatmap_collection = get_heatmap_tiles_collection()
+        await heatmap_collection.update_one(
+            {"tile_id": tile_id},
+            {
+                "$inc": {"scan_count": count},
+                "$setOnInsert": {
+                    "zoom": zoom,
+                    "x": x,
+                    "y": y,
+                    "bbox": osm_service.tile_to_bbox(zoom, x, y)
+                },
+                "$set": {"updated_at": updated_at}
+            },
+            upsert=True
+        )
+        
+        logger.info(f"Batch scan completed: {count} items for user {user_id}")
+        
+        # ==========================================
+        # Return per-item responses
+        # ==========================================
+        recycler_details = {}
+        for material, task in rankings.items():
+            recycler_details[material] = await fetch_recycler_details(task.result())
+        
+        items = []
+        for scan_id, (vision_prediction, _), (llm_response, output_text, _) in zip(
+            scan_ids, vision_results, reasoned
+        ):
+            material = vision_prediction["material"]
+            items.append({
+                "scan_id": scan_id,
+                "material": material,
+                "material_description": vision_prediction.get("detailed_description", material),
+                "raw_detection": vision_prediction.get("raw_detection", material),
+                "confidence": vision_prediction["confidence"],
+                "cleanliness_score": vision_prediction["cleanliness_score"],
+                "hazard_class": vision_prediction["hazard_class"],
+                "disposal_instruction": output_text,
+                "hazard_notes": llm_response.get("hazard_notes"),
+                "cleaning_recommendation": llm_response.get("cleaning_recommendation"),
+                "estimated_credits": llm_response.get("estimated_credits", 0),
+                "environmental_impact": {
+                    "co2_saved_kg": llm_response.get("co2_saved_kg", 0),
+                    "water_saved_liters": llm_response.get("water_saved_liters", 0),
+                    "landfill_saved_kg": llm_response.get("landfill_saved_kg", 0)
+                },
+                "recycler_ranking": recycler_details[material],
+                "pickup_suggestions": llm_response.get("pickup_suggestions", []),
+                "citations": llm_response.get("citations", []),
+                "language": language
+            })
+        
+        return {
+            "count": count,
+            "items": items,
+            "language": language
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch scan failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/voice_input")
 async def voice_input(
     user_id: str = Form(...),
@@ -447,7 +769,8 @@ async def voice_input(
             user_id=user_id,
             query_embedding=v_text,
             global_top_k=5,
-            personal_top_k=3
+            personal_top_k=3,
+            query_text=query_en
         )
         
         logger.info(f"Voice RAG: Retrieved {len(global_docs)} global docs, {len(personal_docs)} personal docs")
@@ -563,7 +886,8 @@ async def rag_query(
             user_id=user_id,
             query_embedding=v_text,
             global_top_k=5,
-            personal_top_k=3
+            personal_top_k=3,
+            query_text=query_en
         )
         
         logger.info(f"Retrieved {len(global_docs)} global docs, {len(personal_docs)} personal docs")
@@ -15,6 +15,10 @@ class Settings(BaseSettings):
     # Milvus
     MILVUS_HOST: str = "localhost"
     MILVUS_PORT: int = 19530
+    MILVUS_INSERT_BUFFER_SIZE: int = 512  # rows per buffered insert
+    MILVUS_INSERT_FLUSH_INTERVAL_MS: float = 1000.0  # max time a row waits in the buffer
+    MILVUS_INSERT_MAX_RETRIES: int = 5  # failed writes (backing off 2x each) before the buffer is dropped
+    MILVUS_EXECUTOR_WORKERS: int = 8  # threads for blocking Milvus RPCs
     
     # Groq API (Free LLM)
     GROQ_API_KEY: str
@@ -31,11 +35,94 @@ class Settings(BaseSettings):
     
     # Vector DB Choice
     VECTOR_DB: str = "faiss"  # milvus or faiss
+    VECTOR_METRIC: str = "l2"  # l2 or ip (inner product = cosine on normalized vectors)
+    
+    # FAISS index (flat, ivf_flat, ivf_pq or hnsw)
+    FAISS_INDEX_TYPE: str = "flat"
+    FAISS_TRAIN_MIN_VECTORS: int = 10000  # IVF types serve from a flat index until this many vectors
+    FAISS_REBUILD_GROWTH: float = 4.0  # retrain IVF once the corpus grows this many times
+    FAISS_NLIST: int = 256
+    FAISS_PQ_M: int = 64  # sub-quantizers; must divide the embedding dimension
+    FAISS_NPROBE: int = 16
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 80
+    FAISS_EF_SEARCH: int = 64
+    FAISS_COMPACT_TOMBSTONE_RATIO: float = 0.2  # rebuild HNSW once this share of it is deleted
+    FAISS_VECTOR_CODEC: str = "fp16"  # fp32, fp16 or sq8 (ivf_pq always stores PQ codes)
+    FAISS_DELTA_MAX_VECTORS: int = 50000  # per-worker inserts before folding into a new shared snapshot
+    
+    # Embeddings stored on Mongo documents as BinData (float16 or float32)
+    EMBEDDING_STORAGE_DTYPE: str = "float16"
+    
+    # FAISS snapshots ("" disables)
+    FAISS_SNAPSHOT_DIR: str = "vector_cache"
+    FAISS_SNAPSHOT_KEEP: int = 2
+    FAISS_SNAPSHOT_REPLAY_MARGIN_S: int = 300  # replay overlap for out-of-order ObjectIds
+    
+    # Index sync across workers (change streams, or polling on standalone Mongo)
+    INDEX_SYNC_ENABLED: bool = True
+    INDEX_SYNC_MODE: str = "auto"  # auto, change_stream or poll
+    INDEX_SYNC_POLL_INTERVAL_S: float = 2.0
+    INDEX_SYNC_POLL_MARGIN_S: float = 30.0  # re-read window for roughly ordered ObjectIds
+    INDEX_SYNC_RECONCILE_INTERVAL_S: float = 300.0  # polling mode: how often to look for deletes
+    
+    # Hybrid global retrieval (BM25 fused with vector hits by reciprocal rank)
+    LEXICAL_SEARCH_ENABLED: bool = True
+    LEXICAL_FUSION_CANDIDATES: int = 20  # hits taken from each ranking before fusion
+    LEXICAL_RRF_K: int = 60
+    
+    # Retrieval result cache (keyed by LSH bits of the query embedding + filters)
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_TTL_S: float = 300.0
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 4096
+    RETRIEVAL_CACHE_LSH_BITS: int = 16  # fewer bits = coarser buckets, more reuse
+    
+    # Personal RAG relevance_count increments (batched into one bulk_write)
+    RELEVANCE_FLUSH_INTERVAL_S: float = 5.0
+    RELEVANCE_FLUSH_MAX_PENDING: int = 1000  # documents waiting before an early flush
     
     # Model Paths
     CLIP_MODEL: str = "openai/clip-vit-base-patch32"
     WHISPER_MODEL: str = "small"  # Using local small model for translation
     
+    # CLIP inference backend
+    CLIP_BACKEND: str = "torch"  # torch or onnx (int8 quantized, CPU)
+    CLIP_ONNX_DIR: str = "model_cache/onnx"
+    CLIP_ONNX_QUANTIZE: bool = True
+    CLIP_ONNX_THREADS: int = 0  # 0 = onnxruntime default
+    
+    # Zero-shot label embeddings (persisted .npy per model + label list)
+    CLIP_LABEL_CACHE_DIR: str = "model_cache/labels"
+    CLIP_PROMPT_ENSEMBLE: bool = True
+    
+    # CLIP image embedding / prediction cache (keyed by upload SHA-256)
+    CLIP_CACHE_ENABLED: bool = True
+    CLIP_CACHE_MAX_ENTRIES: int = 2048
+    CLIP_CACHE_DISK_PATH: str = ""  # e.g. model_cache/clip_images.shelf - empty = memory only
+    
+    # CLIP text embedding cache / bulk encoding
+    CLIP_TEXT_CACHE_MAX_ENTRIES: int = 4096
+    CLIP_TEXT_BULK_BATCH_SIZE: int = 64
+    
+    # Inference executors (blocking model calls run off the event loop)
+    MODEL_EXECUTOR_WORKERS: int = 2
+    WHISPER_EXECUTOR_WORKERS: int = 1
+    INDEX_EXECUTOR_WORKERS: int = 2  # FAISS training / rebuilds and snapshot I/O
+    
+    # CLIP inference micro-batching
+    CLIP_BATCHING_ENABLED: bool = True
+    CLIP_MAX_BATCH_SIZE: int = 16
+    CLIP_MAX_BATCH_WAIT_MS: float = 5.0
+    
+    # Batch scan endpoint
+    SCAN_BATCH_MAX_IMAGES: int = 10
+    
+    # Duplicate-scan image hash: True hashes the full-size upload before EXIF
+    # rotation, matching stored pending_items hashes; False hashes the
+    # draft-decoded image (no second decode, but duplicates of scans hashed
+    # the old way are missed until they leave the 30-day window)
+    IMAGE_HASH_FULL_DECODE: bool = True
+    
     # OSM APIs
     NOMINATIM_URL: str = "https://nominatim.openstreetmap.org"
     OVERPASS_URL: str = "https://overpass-api.de/api/interpreter"
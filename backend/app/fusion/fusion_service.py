@@ -8,6 +8,7 @@ import logging
 from typing import Optional, Dict
 
 from app.config import settings
+from app.services.inference_executor import inference_executor
 
 logger = logging.getLogger(__name__)
 
@@ -162,37 +163,52 @@ class FusionService:
             if self.model is None:
                 await self.initialize()
             
-            # Convert numpy to torch tensors
-            def to_tensor(arr):
-                if arr is not None:
-                    return torch.from_numpy(arr).float().unsqueeze(0).to(self.device)
-                return None
-            
-            v_img_t = to_tensor(v_img)
-            v_text_t = to_tensor(v_text)
-            v_loc_t = to_tensor(v_loc)
-            v_user_t = to_tensor(v_user)
-            v_time_t = to_tensor(v_time)
-            
-            # Fuse
-            with torch.no_grad():
-                v_fused_t = self.model(
-                    v_img=v_img_t,
-                    v_text=v_text_t,
-                    v_loc=v_loc_t,
-                    v_user=v_user_t,
-                    v_time=v_time_t
-                )
-            
-            # Convert back to numpy
-            v_fused = v_fused_t.cpu().numpy()[0]
-            
-            return v_fused
+            # Run the MLPs off the event loop
+            return await inference_executor.run(
+                self._fuse_sync,
+                v_img, v_text, v_loc, v_user, v_time
+            )
             
         except Exception as e:
             logger.error(f"Fusion failed: {e}")
             raise
     
+    def _fuse_sync(
+        self,
+        v_img: Optional[np.ndarray],
+        v_text: Optional[np.ndarray],
+        v_loc: Optional[np.ndarray],
+        v_user: Optional[np.ndarray],
+        v_time: Optional[np.ndarray]
+    ) -> np.ndarray:
+        """Blocking fusion forward pass (runs on the inference executor)"""
+        # Convert numpy to torch tensors
+        def to_tensor(arr):
+            if arr is not None:
+                return torch.from_numpy(arr).float().unsqueeze(0).to(self.device)
+            return None
+        
+        v_img_t = to_tensor(v_img)
+        v_text_t = to_tensor(v_text)
+        v_loc_t = to_tensor(v_loc)
+        v_user_t = to_tensor(v_user)
+        v_time_t = to_tensor(v_time)
+        
+        # Fuse
+        with torch.no_grad():
+            v_fused_t = self.model(
+                v_img=v_img_t,
+                v_text=v_text_t,
+                v_loc=v_loc_t,
+                v_user=v_user_t,
+                v_time=v_time_t
+            )
+        
+        # Convert back to numpy
+        v_fused = v_fused_t.cpu().numpy()[0]
+        
+        return v_fused
+    
     def create_location_features(
         self,
         osm_context: Dict,
@@ -12,6 +12,7 @@ from bson import ObjectId
 from app.config import settings
 from app.services.database import db
 from app.services.vector_db import global_rag_vector_db, personal_rag_vector_db
+from app.services.inference_executor import inference_executor
 
 # Configure logging
 logging.basicConfig(
@@ -30,9 +31,13 @@ async def lifespan(app: FastAPI):
     # Connect to MongoDB
     await db.connect_db()
     
-    # Initialize vector databases
-    await global_rag_vector_db.initialize()
-    await personal_rag_vector_db.initialize()
+    # Initialize vector databases from snapshots + Mongo replay
+    from app.rag.rag_service import rag_service
+    await rag_service.initialize()
+    
+    # Follow other workers' RAG writes
+    from app.rag.index_sync import index_sync_service
+    await index_sync_service.start()
     
     # Initialize AI services
     from app.voice.whisper_service import voice_service
@@ -58,6 +63,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down ReNova backend...")
+    await vision_service.shutdown()
+    await index_sync_service.stop()
+    await rag_service.flush_relevance()
+    await global_rag_vector_db.flush()
+    await personal_rag_vector_db.flush()
+    await rag_service.save_snapshots()
+    inference_executor.shutdown()
     await db.close_db()
     logger.info("ReNova backend shutdown complete")
 
@@ -121,6 +133,26 @@ async def health_check():
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 
+@app.get("/metrics")
+async def metrics():
+    """Inference and retrieval metrics for throughput tuning"""
+    from app.vision.clip_service import vision_service
+    from app.rag.index_sync import index_sync_service
+    from app.rag.rag_service import rag_service
+    
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "vision": vision_service.get_stats(),
+        "vector_db": {
+            "global": global_rag_vector_db.get_stats(),
+            "personal": personal_rag_vector_db.get_stats()
+        },
+        "rag": rag_service.get_stats(),
+        "index_sync": index_sync_service.get_stats(),
+        "executors": inference_executor.get_stats()
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
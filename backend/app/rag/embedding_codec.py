@@ -0,0 +1,44 @@
+"""
+Binary encoding for embeddings stored in MongoDB
+Documents carry their embedding so vector DBs can be rebuilt; a BinData
+field is 2-4x smaller than a BSON array of doubles and decodes without
+building a Python list.
+"""
+from typing import Any, Optional
+
+import numpy as np
+from bson import Binary
+
+from app.config import settings
+
+STORAGE_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+def encode_embedding(embedding: np.ndarray) -> Binary:
+    """Little-endian EMBEDDING_STORAGE_DTYPE bytes as BinData"""
+    dtype = STORAGE_DTYPES.get(settings.EMBEDDING_STORAGE_DTYPE.lower(), np.float16)
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    return Binary(vector.astype(np.dtype(dtype).newbyteorder("<")).tobytes())
+
+
+def decode_embedding(value: Any, dimension: int = 512) -> Optional[np.ndarray]:
+    """
+    Read a stored embedding as float32
+    
+    Accepts BinData written by encode_embedding (the dtype follows from the
+    byte length, so float16 and float32 documents can coexist) and legacy
+    float lists. Returns None for missing or wrong-sized embeddings.
+    """
+    if value is None:
+        return None
+    
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) == 2 * dimension:
+            return np.frombuffer(value, dtype="<f2").astype(np.float32)
+        if len(value) == 4 * dimension:
+            return np.frombuffer(value, dtype="<f4").astype(np.float32)
+        return None
+    
+    if len(value) != dimension:
+        return None
+    return np.asarray(value, dtype=np.float32)
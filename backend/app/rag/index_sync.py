@@ -0,0 +1,293 @@
+"""
+Incremental sync of the in-process vector indexes with MongoDB
+Keeps every worker's FAISS indexes consistent with documents written by
+other workers without full reloads
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from app.config import settings
+from app.services.database import (
+    get_rag_global_collection,
+    get_rag_personal_collection
+)
+from app.services.vector_db import VectorDB, global_rag_vector_db, personal_rag_vector_db
+from app.rag.embedding_codec import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionSync:
+    """Sync state for one collection / vector DB pair"""
+    
+    def __init__(self, name: str, get_collection: Callable, vector_db: VectorDB, metadata_fn: Callable):
+        self.name = name
+        self.get_collection = get_collection
+        self.vector_db = vector_db
+        self.metadata_fn = metadata_fn
+        
+        self.mode: Optional[str] = None  # change_stream or poll
+        self.stream_opened = False
+        # Documents deleted while no worker was running (e.g. seed_data's
+        # delete_many) are still in a loaded snapshot
+        self.reconcile_pending = vector_db.snapshot_loaded
+        self.task: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.inserted = 0
+        self.deleted = 0
+        self.errors = 0
+        self.last_event_at: Optional[float] = None
+
+
+class IndexSyncService:
+    """
+    Applies inserts and deletes from rag_global / rag_personal to this
+    worker's vector DBs
+    
+    With a replica set each collection is tailed through a change stream;
+    every (re)open first catches up from the watermark, and a reopen after
+    an error also reconciles deletes it may have missed. Standalone MongoDB
+    has no change streams, so the fallback polls for new _ids (re-reading
+    the last INDEX_SYNC_POLL_MARGIN_S, since ObjectIds from different
+    processes are only roughly ordered) and reconciles deletes every
+    INDEX_SYNC_RECONCILE_INTERVAL_S. Indexes loaded from a snapshot are
+    reconciled once when their task starts, in the background, instead of
+    during startup. Applying a change is idempotent: ids the index already
+    holds are skipped, including this worker's own inserts. Persistent
+    backends (Milvus) are shared and need no sync.
+    """
+    
+    def __init__(self):
+        self.syncs: List[CollectionSync] = []
+        self.adopt_task: Optional[asyncio.Task] = None
+        self.running = False
+    
+    async def start(self):
+        """Start one sync task per in-process vector DB"""
+        if not settings.INDEX_SYNC_ENABLED or self.running:
+            return
+        
+        from app.rag.rag_service import rag_service
+        
+        self.syncs = [
+            CollectionSync("global", get_rag_global_collection, global_rag_vector_db, rag_service.global_metadata),
+            CollectionSync("personal", get_rag_personal_collection, personal_rag_vector_db, rag_service.personal_metadata),
+        ]
+        self.syncs = [sync for sync in self.syncs if not sync.vector_db.persistent]
+        
+        self.running = True
+        for sync in self.syncs:
+            sync.task = asyncio.create_task(self._run(sync))
+        self.adopt_task = asyncio.create_task(self._adopt_snapshots())
+        
+        logger.info(f"Index sync started for {[sync.name for sync in self.syncs]}")
+    
+    async def stop(self):
+        """Cancel the sync tasks"""
+        self.running = False
+        tasks = [sync.task for sync in self.syncs] + [self.adopt_task]
+        tasks = [task for task in tasks if task is not None]
+        for task in tasks:
+            task.cancel()
+        
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Index sync stopped")
+    
+    async def _run(self, sync: CollectionSync):
+        mode = settings.INDEX_SYNC_MODE.lower()
+        
+        while self.running:
+            try:
+                if mode != "poll" and sync.mode != "poll":
+                    sync.mode = "change_stream"
+                    await self._tail(sync)
+                else:
+                    sync.mode = "poll"
+                    await self._poll(sync)
+                    
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                sync.errors += 1
+                if sync.mode == "change_stream" and not sync.stream_opened and mode == "auto":
+                    # Never opened: standalone server or a mock without change streams
+                    logger.warning(f"Change streams unavailable for rag_{sync.name} ({e}), polling instead")
+                    sync.mode = "poll"
+                    continue
+                
+                logger.error(f"Index sync for rag_{sync.name} failed: {e}")
+                await asyncio.sleep(settings.INDEX_SYNC_POLL_INTERVAL_S)
+    
+    async def _adopt_snapshots(self):
+        """Pick up shared snapshots published by the snapshot-writing worker"""
+        while self.running:
+            await asyncio.sleep(settings.INDEX_SYNC_RECONCILE_INTERVAL_S)
+            for sync in self.syncs:
+                try:
+                    await sync.vector_db.adopt_snapshot()
+                except Exception as e:
+                    logger.error(f"Snapshot adoption for rag_{sync.name} failed: {e}")
+    
+    async def _tail(self, sync: CollectionSync):
+        """Follow the collection's change stream"""
+        collection = sync.get_collection()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "replace", "delete"]}}}]
+        
+        async with collection.watch(pipeline) as stream:
+            # Opens the cursor; raises here on servers without change streams
+            change = await stream.try_next()
+            reopened = sync.stream_opened
+            sync.stream_opened = True
+            
+            # Catch up on anything written before the stream was open
+            await self._catch_up(sync)
+            if reopened or sync.reconcile_pending:
+                await self._reconcile(sync)
+            
+            if change is not None:
+                await self._apply_change(sync, change)
+            
+            async for change in stream:
+                await self._apply_change(sync, change)
+    
+    async def _apply_change(self, sync: CollectionSync, change: Dict):
+        if change["operationType"] == "delete":
+            await self._apply_deletes(sync, [str(change["documentKey"]["_id"])])
+        else:
+            await self._apply_inserts(sync, [change["fullDocument"]])
+    
+    async def _poll(self, sync: CollectionSync):
+        """Polling fallback for standalone MongoDB"""
+        last_reconcile = time.monotonic()
+        
+        while self.running:
+            await self._catch_up(sync)
+            
+            if sync.reconcile_pending or time.monotonic() - last_reconcile >= settings.INDEX_SYNC_RECONCILE_INTERVAL_S:
+                await self._reconcile(sync)
+                last_reconcile = time.monotonic()
+            
+            await asyncio.sleep(settings.INDEX_SYNC_POLL_INTERVAL_S)
+    
+    async def _catch_up(self, sync: CollectionSync):
+        """Index documents newer than the watermark (minus the margin) that are missing"""
+        collection = sync.get_collection()
+        
+        query = {"embedding": {"$exists": True, "$ne": None}}
+        if sync.vector_db.watermark:
+            since = ObjectId(sync.vector_db.watermark).generation_time - timedelta(
+                seconds=settings.INDEX_SYNC_POLL_MARGIN_S
+            )
+            query["_id"] = {"$gte": ObjectId.from_datetime(since)}
+        
+        # Cheap id scan first; embeddings are only read for documents we lack
+        missing = []
+        newest = None
+        async for doc in collection.find(query, {"_id": 1}).sort("_id", 1):
+            newest = str(doc["_id"])
+            if not sync.vector_db.contains(newest):
+                missing.append(doc["_id"])
+        
+        if missing:
+            docs = await collection.find({"_id": {"$in": missing}}).to_list(length=None)
+            await self._apply_inserts(sync, docs)
+        
+        # Everything up to here is indexed, including this worker's own inserts,
+        # so the next scan (and the shutdown snapshot) starts from the newest _id
+        if newest and (not sync.vector_db.watermark or newest > sync.vector_db.watermark):
+            sync.vector_db.watermark = newest
+    
+    async def _reconcile(self, sync: CollectionSync):
+        """Drop indexed ids whose documents are gone (polling can't see deletes)"""
+        indexed = sync.vector_db.doc_ids()
+        if indexed:
+            existing = set()
+            async for doc in sync.get_collection().find({}, {"_id": 1}):
+                existing.add(str(doc["_id"]))
+            
+            stale = [doc_id for doc_id in indexed if doc_id not in existing]
+            if stale:
+                await self._apply_deletes(sync, stale)
+        
+        sync.reconcile_pending = False
+    
+    async def _apply_inserts(self, sync: CollectionSync, docs: List[Dict]):
+        from app.rag.rag_service import rag_service
+        
+        doc_ids, embeddings, metadata = [], [], []
+        seen = set()
+        for doc in docs:
+            doc_id = str(doc["_id"])
+            embedding = decode_embedding(doc.get("embedding"), sync.vector_db.dimension)
+            if embedding is None or sync.vector_db.contains(doc_id) or doc_id in seen:
+                continue
+            
+            seen.add(doc_id)
+            doc_ids.append(doc_id)
+            embeddings.append(embedding)
+            metadata.append(sync.metadata_fn(doc))
+            
+            if sync.name == "global":
+                rag_service.cache_global_document(doc)
+        
+        if not doc_ids:
+            return
+        
+        await sync.vector_db.insert(ids=doc_ids, embeddings=np.stack(embeddings), metadata=metadata)
+        
+        if sync.name == "global":
+            rag_service.global_cache.invalidate()
+        else:
+            for user_id in {entry["user_id"] for entry in metadata}:
+                rag_service.personal_cache.invalidate(user_id)
+        
+        newest = max(doc_ids)
+        if not sync.vector_db.watermark or newest > sync.vector_db.watermark:
+            sync.vector_db.watermark = newest
+        
+        sync.inserted += len(doc_ids)
+        sync.last_event_at = time.time()
+        logger.info(f"Index sync: added {len(doc_ids)} rag_{sync.name} documents")
+    
+    async def _apply_deletes(self, sync: CollectionSync, doc_ids: List[str]):
+        from app.rag.rag_service import rag_service
+        
+        if sync.name == "global":
+            for doc_id in doc_ids:
+                rag_service.evict_global_document(doc_id)
+        
+        doc_ids = [doc_id for doc_id in doc_ids if sync.vector_db.contains(doc_id)]
+        if not doc_ids:
+            return
+        
+        await sync.vector_db.delete(doc_ids)
+        
+        # Deletes don't say whose documents they were
+        (rag_service.global_cache if sync.name == "global" else rag_service.personal_cache).invalidate()
+        
+        sync.deleted += len(doc_ids)
+        sync.last_event_at = time.time()
+        logger.info(f"Index sync: removed {len(doc_ids)} rag_{sync.name} documents")
+    
+    def get_stats(self) -> Dict:
+        return {
+            sync.name: {
+                "mode": sync.mode,
+                "inserted": sync.inserted,
+                "deleted": sync.deleted,
+                "errors": sync.errors,
+                "last_event_at": sync.last_event_at,
+            }
+            for sync in self.syncs
+        }
+
+
+# Global index sync instance
+index_sync_service = IndexSyncService()
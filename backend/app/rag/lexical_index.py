@@ -0,0 +1,159 @@
+"""
+In-process BM25 inverted index
+Complements CLIP retrieval on exact tokens ("HDPE #2", "Li-ion") that the
+text encoder blurs or truncates past 77 tokens
+"""
+import heapq
+import logging
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words joined by - / . or a leading # stay one token ("li-ion", "#2", "e-waste")
+TOKEN_PATTERN = re.compile(r"#?[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in into is it its my of on or "
+    "should the this to what where which with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms; compound tokens are emitted whole and as their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1 or token.startswith("#"):
+            terms.append(token)
+        terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 over a few fields per document, updated incrementally
+    
+    Postings map term -> {doc_id: term frequency}; document lengths and
+    their total are kept up to date so avgdl needs no pass over the corpus.
+    Filters use the same form as the vector DBs: a value or a list of
+    allowed values (None matches documents without the field).
+    """
+    
+    def __init__(self, filter_fields: Tuple[str, ...] = (), k1: float = 1.2, b: float = 0.75):
+        self.filter_fields = tuple(filter_fields)
+        self.k1 = k1
+        self.b = b
+        
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_fields: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        
+        # Metrics
+        self.searches = 0
+        self.search_seconds = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+    
+    def add(self, doc_id: str, text: str, fields: Optional[Dict[str, Any]] = None):
+        """Index (or re-index) one document"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        
+        length = sum(terms.values())
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = length
+        self.doc_fields[doc_id] = {field: (fields or {}).get(field) for field in self.filter_fields}
+        self.total_length += length
+    
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.doc_fields.pop(doc_id, None)
+    
+    def _matches(self, doc_id: str, filters: Dict[str, Any]) -> bool:
+        fields = self.doc_fields.get(doc_id, {})
+        for field, value in filters.items():
+            allowed = value if isinstance(value, (list, tuple, set, frozenset)) else (value,)
+            if fields.get(field) not in allowed:
+                return False
+        return True
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        """Top documents by BM25 score, best first"""
+        started = time.perf_counter()
+        
+        terms = set(tokenize(query))
+        n_docs = len(self.doc_lengths)
+        if not terms or not n_docs:
+            return []
+        
+        avgdl = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            
+            df = len(posting)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        
+        if filters:
+            scores = {doc_id: score for doc_id, score in scores.items() if self._matches(doc_id, filters)}
+        
+        results = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return results
+    
+    def get_stats(self) -> Dict:
+        return {
+            "documents": len(self.doc_lengths),
+            "terms": len(self.postings),
+            "avg_doc_length": round(self.total_length / len(self.doc_lengths), 1) if self.doc_lengths else 0.0,
+            "searches": self.searches,
+            "avg_search_ms": round(1000 * self.search_seconds / self.searches, 4) if self.searches else 0.0,
+        }
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Tuple[str, float]]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked (doc_id, score) lists by sum of 1 / (k + rank)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
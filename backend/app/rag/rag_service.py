@@ -1,18 +1,24 @@
 """
 RAG (Retrieval-Augmented Generation) service
 """
+import asyncio
 import logging
 from typing import List, Dict, Optional, Tuple
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from app.config import settings
 from app.services.database import (
     get_rag_global_collection,
     get_rag_personal_collection
 )
 from app.services.vector_db import global_rag_vector_db, personal_rag_vector_db
+from app.rag.embedding_codec import encode_embedding, decode_embedding
+from app.rag.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.rag.retrieval_cache import RetrievalCache
 from app.models.rag_models import GlobalRAGDocument, PersonalRAGDocument
 from bson import ObjectId
+from pymongo import UpdateOne
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +26,36 @@ logger = logging.getLogger(__name__)
 class RAGService:
     """Service for RAG document retrieval"""
     
+    # Fields read for the store and the lexical index (no embedding)
+    GLOBAL_PROJECTION = {"title": 1, "content": 1, "category": 1, "tags": 1, "city": 1}
+    
     def __init__(self):
         self.initialized = False
+        
+        # Display fields of global documents (a few hundred small docs), so
+        # global retrieval is answered from memory after the vector search
+        self.global_documents: Dict[str, Dict] = {}
+        
+        # BM25 over the same documents, fused with vector hits when the
+        # query has text
+        self.global_lexical_index = LexicalIndex(filter_fields=("category", "city"))
+        
+        # Results per LSH bucket of the query; cleared on inserts and deletes
+        cache_options = dict(
+            dimension=global_rag_vector_db.dimension,
+            bits=settings.RETRIEVAL_CACHE_LSH_BITS,
+            ttl_s=settings.RETRIEVAL_CACHE_TTL_S,
+            max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES
+        )
+        self.global_cache = RetrievalCache("global", **cache_options)
+        self.personal_cache = RetrievalCache("personal", **cache_options)
+        
+        # relevance_count increments waiting for the next bulk write
+        self.pending_relevance: Dict[str, int] = {}
+        self._relevance_timer: Optional[asyncio.Task] = None
+        self._relevance_tasks = set()
+        self.relevance_flushes = 0
+        self.relevance_flush_errors = 0
     
     async def initialize(self):
         """Initialize RAG service and vector DBs"""
@@ -32,8 +66,9 @@ class RAGService:
             await global_rag_vector_db.initialize()
             await personal_rag_vector_db.initialize()
             
-            # Load existing embeddings from MongoDB into FAISS
+            # Load snapshots and replay newer embeddings from MongoDB
             await self._load_existing_embeddings()
+            await self._load_global_documents()
             
             self.initialized = True
             logger.info("RAG service initialized")
@@ -43,72 +78,164 @@ class RAGService:
             raise
     
     async def _load_existing_embeddings(self):
-        """Load existing embeddings from MongoDB into FAISS"""
+        """Load each vector DB from its snapshot, then replay newer Mongo documents"""
         try:
-            # Load global documents
-            global_collection = get_rag_global_collection()
-            global_docs = await global_collection.find({"embedding": {"$exists": True, "$ne": None}}).to_list(length=None)
-            
-            if global_docs:
-                doc_ids = []
-                embeddings = []
-                metadata = []
-                
-                for doc in global_docs:
-                    doc_id = str(doc["_id"])
-                    embedding = doc.get("embedding")
-                    
-                    if embedding and len(embedding) == 512:
-                        doc_ids.append(doc_id)
-                        embeddings.append(embedding)
-                        metadata.append({
-                            "title": doc.get("title", doc.get("content", "")[:50]),
-                            "category": doc.get("category", "")
-                        })
-                
-                if embeddings:
-                    embeddings_array = np.array(embeddings, dtype=np.float32)
-                    await global_rag_vector_db.insert(
-                        ids=doc_ids,
-                        embeddings=embeddings_array,
-                        metadata=metadata
-                    )
-                    logger.info(f"Loaded {len(embeddings)} global documents into vector DB")
-            
-            # Load personal documents
-            personal_collection = get_rag_personal_collection()
-            personal_docs = await personal_collection.find({"embedding": {"$exists": True, "$ne": None}}).to_list(length=None)
-            
-            if personal_docs:
-                doc_ids = []
-                embeddings = []
-                metadata = []
-                
-                for doc in personal_docs:
-                    doc_id = str(doc["_id"])
-                    embedding = doc.get("embedding")
-                    
-                    if embedding and len(embedding) == 512:
-                        doc_ids.append(doc_id)
-                        embeddings.append(embedding)
-                        metadata.append({
-                            "user_id": str(doc.get("user_id", "")),
-                            "doc_type": doc.get("doc_type", "")
-                        })
-                
-                if embeddings:
-                    embeddings_array = np.array(embeddings, dtype=np.float32)
-                    await personal_rag_vector_db.insert(
-                        ids=doc_ids,
-                        embeddings=embeddings_array,
-                        metadata=metadata
-                    )
-                    logger.info(f"Loaded {len(embeddings)} personal documents into vector DB")
-                    
+            await self._sync_vector_db(
+                global_rag_vector_db,
+                get_rag_global_collection(),
+                self.global_metadata
+            )
+            await self._sync_vector_db(
+                personal_rag_vector_db,
+                get_rag_personal_collection(),
+                self.personal_metadata
+            )
+            
         except Exception as e:
             logger.error(f"Failed to load existing embeddings: {e}")
             # Don't raise - allow service to continue with empty vector DB
     
+    @staticmethod
+    def global_metadata(doc: Dict) -> Dict:
+        """Vector DB metadata for a rag_global document"""
+        return {
+            "title": doc.get("title", doc.get("content", "")[:50]),
+            "category": doc.get("category", ""),
+            "city": doc.get("city")
+        }
+    
+    @staticmethod
+    def personal_metadata(doc: Dict) -> Dict:
+        """Vector DB metadata for a rag_personal document"""
+        return {
+            "user_id": str(doc.get("user_id", "")),
+            "doc_type": doc.get("doc_type", "")
+        }
+    
+    @staticmethod
+    def _global_display(doc: Dict) -> Dict:
+        return {
+            "title": doc.get("title", ""),
+            "content": doc.get("content", ""),
+            "category": doc.get("category", "")
+        }
+    
+    def cache_global_document(self, doc: Dict):
+        """Add a rag_global document to the in-memory store and the lexical index"""
+        doc_id = str(doc["_id"])
+        self.global_documents[doc_id] = self._global_display(doc)
+        text = " ".join([
+            doc.get("title") or "",
+            doc.get("content") or "",
+            doc.get("category") or "",
+            *(doc.get("tags") or [])
+        ])
+        self.global_lexical_index.add(doc_id, text, {"category": doc.get("category", ""), "city": doc.get("city")})
+    
+    def evict_global_document(self, doc_id: str):
+        self.global_documents.pop(doc_id, None)
+        self.global_lexical_index.remove(doc_id)
+    
+    async def _load_global_documents(self):
+        """Fill the in-memory store of global documents and the lexical index"""
+        try:
+            collection = get_rag_global_collection()
+            cursor = collection.find({}, self.GLOBAL_PROJECTION)
+            
+            async for doc in cursor:
+                self.cache_global_document(doc)
+            
+            logger.info(f"Cached {len(self.global_documents)} global RAG documents")
+            
+        except Exception as e:
+            logger.error(f"Failed to load global documents: {e}")
+            # Don't raise - retrieve_global falls back to MongoDB for misses
+    
+    async def _sync_vector_db(self, vector_db, collection, metadata_fn, batch_size: int = 1000):
+        """
+        Bring one vector DB up to date with its Mongo collection
+        
+        Only documents with _id at or after the snapshot watermark (minus
+        FAISS_SNAPSHOT_REPLAY_MARGIN_S, since ObjectIds from different
+        processes are only roughly ordered) are read; ids already in the
+        snapshot are skipped. Without a snapshot this is a full load.
+        Documents deleted since the snapshot are dropped later by index
+        sync's background reconcile, not on this cold-start path.
+        
+        Persistent backends (Milvus) keep their vectors server-side and are
+        only backfilled when their collection is new or empty.
+        """
+        if vector_db.persistent:
+            if await vector_db.count():
+                return
+            logger.info(f"Vector DB '{vector_db.name}' is empty, backfilling from MongoDB")
+        
+        has_snapshot = await vector_db.load_snapshot()
+        
+        query = {"embedding": {"$exists": True, "$ne": None}}
+        if has_snapshot and vector_db.watermark:
+            since = ObjectId(vector_db.watermark).generation_time - timedelta(
+                seconds=settings.FAISS_SNAPSHOT_REPLAY_MARGIN_S
+            )
+            query["_id"] = {"$gte": ObjectId.from_datetime(since)}
+        
+        watermark = vector_db.watermark
+        replayed = 0
+        doc_ids, embeddings, metadata = [], [], []
+        
+        async def flush():
+            nonlocal replayed
+            if doc_ids:
+                await vector_db.insert(
+                    ids=list(doc_ids),
+                    embeddings=np.stack(embeddings),
+                    metadata=list(metadata)
+                )
+                replayed += len(doc_ids)
+                doc_ids.clear()
+                embeddings.clear()
+                metadata.clear()
+        
+        async for doc in collection.find(query).sort("_id", 1):
+            doc_id = str(doc["_id"])
+            watermark = doc_id
+            
+            embedding = decode_embedding(doc.get("embedding"), vector_db.dimension)
+            if embedding is None or vector_db.contains(doc_id):
+                continue
+            
+            doc_ids.append(doc_id)
+            embeddings.append(embedding)
+            metadata.append(metadata_fn(doc))
+            
+            if len(doc_ids) >= batch_size:
+                await flush()
+        
+        await flush()
+        
+        logger.info(f"Vector DB '{vector_db.name}': snapshot={has_snapshot}, replayed {replayed} documents")
+        
+        if vector_db.persistent:
+            # Documents stored without an embedding may still be in the pre-rename collection
+            legacy_ids = [str(doc["_id"]) async for doc in collection.find({"embedding": None}, {"_id": 1})]
+            if legacy_ids:
+                await vector_db.import_legacy(legacy_ids)
+            await vector_db.flush()
+            return
+        
+        changed = replayed or watermark != vector_db.watermark
+        vector_db.watermark = watermark  # index sync resumes from here
+        if changed:
+            await vector_db.save_snapshot(watermark)
+    
+    async def save_snapshots(self):
+        """Persist vector DB snapshots (called on shutdown)"""
+        if not self.initialized:
+            return
+        
+        await global_rag_vector_db.save_snapshot()
+        await personal_rag_vector_db.save_snapshot()
+    
     async def add_global_document(
         self,
         title: str,
@@ -136,9 +263,12 @@ class RAGService:
                 ward=ward
             )
             
-            # Insert into MongoDB
+            # Insert into MongoDB (embedding kept so vector DBs can be rebuilt)
+            record = doc.model_dump(by_alias=True, exclude=["id"])
+            record["embedding"] = encode_embedding(embedding)
+            
             collection = get_rag_global_collection()
-            result = await collection.insert_one(doc.model_dump(by_alias=True, exclude=["id"]))
+            result = await collection.insert_one(record)
             doc_id = str(result.inserted_id)
             
             # Update with embedding ID
@@ -151,8 +281,10 @@ class RAGService:
             await global_rag_vector_db.insert(
                 ids=[doc_id],
                 embeddings=embedding.reshape(1, -1),
-                metadata=[{"title": title, "category": category}]
+                metadata=[{"title": title, "category": category, "city": city}]
             )
+            self.cache_global_document({**record, "_id": doc_id})
+            self.global_cache.invalidate()
             
             logger.info(f"Added global RAG document: {doc_id}")
             return doc_id
@@ -186,9 +318,12 @@ class RAGService:
                 location=location
             )
             
-            # Insert into MongoDB
+            # Insert into MongoDB (embedding kept so vector DBs can be rebuilt)
+            record = doc.model_dump(by_alias=True, exclude=["id"])
+            record["embedding"] = encode_embedding(embedding)
+            
             collection = get_rag_personal_collection()
-            result = await collection.insert_one(doc.model_dump(by_alias=True, exclude=["id"]))
+            result = await collection.insert_one(record)
             doc_id = str(result.inserted_id)
             
             # Update with embedding ID
@@ -201,8 +336,9 @@ class RAGService:
             await personal_rag_vector_db.insert(
                 ids=[doc_id],
                 embeddings=embedding.reshape(1, -1),
-                metadata={"user_id": user_id, "doc_type": doc_type}
+                metadata=[{"user_id": user_id, "doc_type": doc_type}]
             )
+            self.personal_cache.invalidate(user_id)
             
             logger.info(f"Added personal RAG document: {doc_id}")
             return doc_id
@@ -216,11 +352,15 @@ class RAGService:
         query_embedding: np.ndarray,
         top_k: int = 5,
         category: Optional[str] = None,
-        city: Optional[str] = None
+        city: Optional[str] = None,
+        query_text: Optional[str] = None
     ) -> List[Dict]:
         """
         Retrieve relevant documents from global RAG
         
+        With query_text, BM25 hits are merged with the vector hits by
+        reciprocal-rank fusion and "score" is the fused score.
+        
         Returns:
             List of documents with scores
         """
@@ -228,44 +368,58 @@ class RAGService:
             if not self.initialized:
                 await self.initialize()
             
-            # Search vector DB
-            results = await global_rag_vector_db.search(query_embedding, top_k=top_k * 2)
-            
-            # Fetch documents from MongoDB
-            doc_ids = [ObjectId(doc_id) for doc_id, _ in results]
-            collection = get_rag_global_collection()
-            
-            # Build filter
-            filter_query = {"_id": {"$in": doc_ids}}
+            if settings.RETRIEVAL_CACHE_ENABLED:
+                cache_key = self.global_cache.key(
+                    query_embedding,
+                    top_k=top_k,
+                    category=category,
+                    city=city,
+                    query_text=" ".join((query_text or "").lower().split())
+                )
+                cached = self.global_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                cache_token = self.global_cache.token()
+            
+            # Filter inside the vector search so exactly top_k matches come back
+            filters = {}
             if category:
-                filter_query["category"] = category
+                filters["category"] = category
             if city:
-                filter_query["$or"] = [
-                    {"city": city},
-                    {"city": None}  # Also get generic docs
-                ]
+                filters["city"] = [city, None]  # Also get generic docs
             
-            cursor = collection.find(filter_query)
-            docs = await cursor.to_list(length=top_k * 2)
+            hybrid = settings.LEXICAL_SEARCH_ENABLED and bool(query_text)
+            depth = max(top_k, settings.LEXICAL_FUSION_CANDIDATES) if hybrid else top_k
             
-            # Combine with scores
-            score_map = {doc_id: score for doc_id, score in results}
+            results = await global_rag_vector_db.search(query_embedding, top_k=depth, filters=filters or None)
             
-            output = []
-            for doc in docs:
-                doc_id = str(doc["_id"])
-                if doc_id in score_map:
-                    output.append({
-                        "id": doc_id,
-                        "title": doc.get("title", ""),
-                        "content": doc.get("content", ""),
-                        "category": doc.get("category", ""),
-                        "score": score_map[doc_id]
-                    })
+            # Documents added by another worker aren't in the store yet
+            missing = [ObjectId(doc_id) for doc_id, _ in results if doc_id not in self.global_documents]
+            if missing:
+                collection = get_rag_global_collection()
+                cursor = collection.find({"_id": {"$in": missing}}, self.GLOBAL_PROJECTION)
+                async for doc in cursor:
+                    self.cache_global_document(doc)
+            
+            if hybrid:
+                lexical = self.global_lexical_index.search(query_text, top_k=depth, filters=filters or None)
+                if lexical:
+                    results = reciprocal_rank_fusion([results, lexical], k=settings.LEXICAL_RRF_K)
+            
+            # Combine with scores
+            output = [
+                {"id": doc_id, **self.global_documents[doc_id], "score": score}
+                for doc_id, score in results
+                if doc_id in self.global_documents
+            ]
             
             # Sort by score and limit
             output.sort(key=lambda x: x["score"], reverse=True)
-            return output[:top_k]
+            output = output[:top_k]
+            
+            if settings.RETRIEVAL_CACHE_ENABLED:
+                self.global_cache.put(cache_key, output, cache_token)
+            return output
             
         except Exception as e:
             logger.error(f"Failed to retrieve global documents: {e}")
@@ -288,8 +442,20 @@ class RAGService:
             if not self.initialized:
                 await self.initialize()
             
-            # Search vector DB
-            results = await personal_rag_vector_db.search(query_embedding, top_k=top_k * 2)
+            if settings.RETRIEVAL_CACHE_ENABLED:
+                cache_key = self.personal_cache.key(query_embedding, user_id, top_k=top_k, doc_type=doc_type)
+                cached = self.personal_cache.get(cache_key)
+                if cached is not None:
+                    self._count_relevance([doc["id"] for doc in cached])
+                    return cached
+                cache_token = self.personal_cache.token(user_id)
+            
+            # Search only this user's vectors
+            filters = {"user_id": user_id}
+            if doc_type:
+                filters["doc_type"] = doc_type
+            
+            results = await personal_rag_vector_db.search(query_embedding, top_k=top_k, filters=filters)
             
             # Fetch documents from MongoDB
             doc_ids = [ObjectId(doc_id) for doc_id, _ in results]
@@ -303,7 +469,7 @@ class RAGService:
             if doc_type:
                 filter_query["doc_type"] = doc_type
             
-            cursor = collection.find(filter_query)
+            cursor = collection.find(filter_query, {"embedding": 0})
             docs = await cursor.to_list(length=top_k * 2)
             
             # Combine with scores
@@ -319,21 +485,96 @@ class RAGService:
                         "doc_type": doc.get("doc_type", ""),
                         "score": score_map[doc_id]
                     })
-                    
-                    # Increment relevance count
-                    await collection.update_one(
-                        {"_id": ObjectId(doc_id)},
-                        {"$inc": {"relevance_count": 1}}
-                    )
             
             # Sort by score and limit
             output.sort(key=lambda x: x["score"], reverse=True)
-            return output[:top_k]
+            output = output[:top_k]
+            
+            if settings.RETRIEVAL_CACHE_ENABLED:
+                self.personal_cache.put(cache_key, output, cache_token)
+            
+            self._count_relevance([doc["id"] for doc in output])
+            return output
             
         except Exception as e:
             logger.error(f"Failed to retrieve personal documents: {e}")
             return []
     
+    def _count_relevance(self, doc_ids: List[str]):
+        """
+        Count retrievals of personal documents in memory
+        
+        The increments reach MongoDB as one bulk write per
+        RELEVANCE_FLUSH_INTERVAL_S, or sooner once
+        RELEVANCE_FLUSH_MAX_PENDING documents are waiting.
+        """
+        for doc_id in doc_ids:
+            self.pending_relevance[doc_id] = self.pending_relevance.get(doc_id, 0) + 1
+        
+        if not self.pending_relevance:
+            return
+        
+        if len(self.pending_relevance) >= settings.RELEVANCE_FLUSH_MAX_PENDING:
+            task = asyncio.create_task(self._write_relevance())
+            self._relevance_tasks.add(task)
+            task.add_done_callback(self._relevance_tasks.discard)
+        elif self._relevance_timer is None or self._relevance_timer.done():
+            self._relevance_timer = asyncio.create_task(self._write_relevance_after_interval())
+    
+    async def _write_relevance_after_interval(self):
+        await asyncio.sleep(settings.RELEVANCE_FLUSH_INTERVAL_S)
+        # Past this point flush_relevance() must not cancel us mid-write
+        self._relevance_timer = None
+        await self._write_relevance()
+    
+    async def _write_relevance(self):
+        """Send all pending increments as one unordered bulk_write"""
+        if not self.pending_relevance:
+            return
+        
+        pending, self.pending_relevance = self.pending_relevance, {}
+        
+        try:
+            await get_rag_personal_collection().bulk_write(
+                [
+                    UpdateOne({"_id": ObjectId(doc_id)}, {"$inc": {"relevance_count": count}})
+                    for doc_id, count in pending.items()
+                ],
+                ordered=False
+            )
+            self.relevance_flushes += 1
+            
+        except Exception as e:
+            self.relevance_flush_errors += 1
+            logger.error(f"Failed to write relevance counts for {len(pending)} documents: {e}")
+            # Keep the counts for the next flush
+            for doc_id, count in pending.items():
+                self.pending_relevance[doc_id] = self.pending_relevance.get(doc_id, 0) + count
+    
+    async def flush_relevance(self):
+        """Write pending relevance counts now (shutdown)"""
+        if self._relevance_timer is not None and not self._relevance_timer.done():
+            self._relevance_timer.cancel()
+        self._relevance_timer = None
+        
+        if self._relevance_tasks:
+            await asyncio.gather(*self._relevance_tasks, return_exceptions=True)
+        await self._write_relevance()
+    
+    def get_stats(self) -> Dict:
+        return {
+            "lexical_index": self.global_lexical_index.get_stats(),
+            "retrieval_cache": {
+                "global": self.global_cache.get_stats(),
+                "personal": self.personal_cache.get_stats()
+            },
+            "relevance": {
+                "pending": len(self.pending_relevance),
+                "flushes": self.relevance_flushes,
+                "flush_errors": self.relevance_flush_errors
+            }
+        }
+    
     async def dual_retrieve(
         self,
         user_id: str,
@@ -341,23 +582,25 @@ class RAGService:
         global_top_k: int = 5,
         personal_top_k: int = 3,
         category: Optional[str] = None,
-        city: Optional[str] = None
+        city: Optional[str] = None,
+        query_text: Optional[str] = None
     ) -> Tuple[List[Dict], List[Dict]]:
         """
         Retrieve from both global and personal RAG
         
+        query_text (English) enables lexical matching on the global side
+        
         Returns:
             (global_docs, personal_docs)
         """
         try:
             # Retrieve in parallel
-            import asyncio
-            
             global_task = self.retrieve_global(
                 query_embedding,
                 top_k=global_top_k,
                 category=category,
-                city=city
+                city=city,
+                query_text=query_text
             )
             personal_task = self.retrieve_personal(
                 user_id,
@@ -0,0 +1,102 @@
+"""
+Cache of retrieval results keyed by a locality-sensitive hash of the query
+Near-identical fused embeddings (the same item scanned in the same ward and
+hour) land in one bucket and reuse its results
+"""
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.vision.embedding_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalCache:
+    """
+    TTL + LRU cache of result lists, keyed by random-hyperplane LSH bits
+    
+    Each of the `bits` hyperplanes contributes the sign of its projection,
+    so two queries share a key with probability (1 - angle / pi) ** bits.
+    Entries carry the generation of their scope (e.g. a user_id) at lookup
+    time; invalidate() bumps it, which also drops results of searches that
+    were already in flight when a document was inserted.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        dimension: int = 512,
+        bits: int = 16,
+        ttl_s: float = 300.0,
+        max_entries: int = 4096,
+        seed: int = 0
+    ):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.hyperplanes = np.random.default_rng(seed).standard_normal((bits, dimension)).astype(np.float32)
+        self.entries = LRUCache(max_entries)
+        
+        self.generation = 0
+        self.scope_generations: Dict[Hashable, int] = {}
+        
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+    
+    def key(self, query_embedding: np.ndarray, scope: Hashable = None, **filters: Any) -> Tuple:
+        """Cache key for a query vector, its scope and any other filters"""
+        projections = self.hyperplanes @ np.asarray(query_embedding, dtype=np.float32).ravel()
+        bucket = np.packbits(projections > 0).tobytes()
+        return bucket, scope, tuple(sorted(filters.items()))
+    
+    def token(self, scope: Hashable = None) -> Tuple[int, int]:
+        return self.generation, self.scope_generations.get(scope, 0)
+    
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        """Copies of the cached results, or None"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, token, results = entry
+            if token == self.token(key[1]) and expires_at > time.monotonic():
+                self.hits += 1
+                return [dict(result) for result in results]
+            
+            self.expired += 1
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key: Tuple, results: List[Dict], token: Tuple[int, int]):
+        """Store results computed under `token`; dropped if invalidated since"""
+        if token != self.token(key[1]):
+            return
+        
+        self.entries.put(key, (time.monotonic() + self.ttl_s, token, [dict(result) for result in results]))
+    
+    def invalidate(self, scope: Hashable = None):
+        """Drop one scope's entries, or everything when scope is None"""
+        self.invalidations += 1
+        if scope is None:
+            self.generation += 1
+            self.entries.clear()
+        else:
+            self.scope_generations[scope] = self.scope_generations.get(scope, 0) + 1
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.entries.max_entries,
+            "lsh_bits": len(self.hyperplanes),
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,119 @@
+"""
+Executor layer for blocking model inference
+Keeps torch / Whisper work, FAISS index builds and Milvus RPCs off the
+asyncio event loop
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pools for model calls
+    
+    torch and Whisper release the GIL inside their kernels, so a thread pool
+    is enough to keep I/O-bound endpoints (health, wallet reads) serving while
+    a model runs. Vision/fusion and audio get separate pools so a long
+    transcription never starves scans.
+    
+    Milvus client calls are blocking gRPC requests that spend their time
+    waiting on the network, so they get their own, wider pool: concurrent
+    scans overlap their vector searches and never queue behind a model call.
+    
+    FAISS training, HNSW builds and snapshot reads/writes can take minutes,
+    so they run on an index pool rather than holding a vision/fusion thread
+    for the whole rebuild.
+    """
+    
+    # kind -> (settings attribute for the worker count, thread name prefix)
+    POOLS = {
+        "model": ("MODEL_EXECUTOR_WORKERS", "inference"),
+        "audio": ("WHISPER_EXECUTOR_WORKERS", "whisper"),
+        "vector_db": ("MILVUS_EXECUTOR_WORKERS", "milvus"),
+        "index": ("INDEX_EXECUTOR_WORKERS", "faiss-index"),
+    }
+    
+    def __init__(self):
+        self.pools: Dict[str, ThreadPoolExecutor] = {}
+        
+        # Metrics
+        self.stats = {
+            kind: {"calls": 0, "in_flight": 0, "total_time": 0.0}
+            for kind in self.POOLS
+        }
+    
+    def _get_pool(self, kind: str) -> ThreadPoolExecutor:
+        """Create pools lazily so worker counts come from current settings"""
+        pool = self.pools.get(kind)
+        if pool is None:
+            workers_setting, prefix = self.POOLS[kind]
+            pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, workers_setting),
+                thread_name_prefix=prefix
+            )
+            self.pools[kind] = pool
+        return pool
+    
+    async def _submit(self, kind: str, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        stats = self.stats[kind]
+        
+        stats["calls"] += 1
+        stats["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self._get_pool(kind),
+                functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            stats["in_flight"] -= 1
+            stats["total_time"] += time.perf_counter() - started
+    
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking vision/fusion model call on the inference pool"""
+        return await self._submit("model", fn, *args, **kwargs)
+    
+    async def run_audio(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Whisper / audio decoding call on the audio pool"""
+        return await self._submit("audio", fn, *args, **kwargs)
+    
+    async def run_vector_db(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Milvus client call on the vector DB pool"""
+        return await self._submit("vector_db", fn, *args, **kwargs)
+    
+    async def run_index(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking FAISS build or snapshot read/write on the index pool"""
+        return await self._submit("index", fn, *args, **kwargs)
+    
+    def get_stats(self) -> Dict:
+        """Pool sizes and call counters"""
+        return {
+            kind: {
+                "workers": getattr(settings, self.POOLS[kind][0]),
+                "calls": stats["calls"],
+                "in_flight": stats["in_flight"],
+                "avg_time_ms": 1000.0 * stats["total_time"] / stats["calls"] if stats["calls"] else 0.0,
+            }
+            for kind, stats in self.stats.items()
+        }
+    
+    def shutdown(self):
+        """Wait for running calls and release worker threads"""
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+        
+        self.pools = {}
+        logger.info("Inference executors shut down")
+
+
+# Global inference executor instance
+inference_executor = InferenceExecutor()
@@ -1,13 +1,25 @@
 """
 Vector database service - supports Milvus and FAISS
 """
+import asyncio
+import json
 import numpy as np
 import logging
-from typing import List, Tuple, Optional
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple, Optional
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# flock elects the worker that writes FAISS snapshots (POSIX only)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Import FAISS
 try:
     import faiss
@@ -20,9 +32,17 @@ except ImportError:
 class VectorDB:
     """Abstract vector database interface"""
     
-    def __init__(self):
+    # True when vectors survive restarts server-side (only backfilled from Mongo when empty)
+    persistent = False
+    
+    def __init__(self, name: str = "default", filter_fields: Tuple[str, ...] = ()):
+        self.name = name
+        self.filter_fields = tuple(filter_fields)  # metadata fields with postings for filtered search
         self.initialized = False
         self.dimension = 512  # CLIP ViT-B/32 embedding dimension
+        self.metric = "ip" if settings.VECTOR_METRIC.lower() == "ip" else "l2"
+        self.watermark: Optional[str] = None  # last Mongo _id covered by the loaded snapshot
+        self.snapshot_loaded = False  # started from a snapshot: deletes since then need reconciling
     
     async def initialize(self):
         """Initialize the vector database"""
@@ -32,44 +52,522 @@ class VectorDB:
         """Insert vectors"""
         raise NotImplementedError
     
-    async def search(self, query_embedding: np.ndarray, top_k: int = 10) -> List[Tuple[str, float]]:
-        """Search for similar vectors"""
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Search for similar vectors
+        
+        Args:
+            nprobe: IVF lists to visit (overrides the configured default)
+            ef_search: HNSW candidate list size (overrides the configured default)
+            filters: Metadata constraints {field: value or [allowed values]};
+                only matching vectors are ranked
+        """
+        raise NotImplementedError
+    
+    async def search_batch(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search [n, dim] queries in one call; one result list per query"""
         raise NotImplementedError
     
     async def delete(self, ids: List[str]):
         """Delete vectors"""
         raise NotImplementedError
+    
+    @staticmethod
+    def _to_score(value: float, metric: str) -> float:
+        """Raw index output -> similarity (cosine for ip, 1/(1+d) for l2)"""
+        if metric == "ip":
+            return float(value)
+        return float(1 / (1 + value))  # Convert distance to similarity
+    
+    def contains(self, doc_id: str) -> bool:
+        """Whether a document is already indexed (used to skip replays)"""
+        return False
+    
+    def doc_ids(self) -> List[str]:
+        """Indexed document IDs (empty when the backend doesn't track them)"""
+        return []
+    
+    async def count(self) -> int:
+        """Number of stored vectors"""
+        return len(self.doc_ids())
+    
+    async def import_legacy(self, ids: List[str]) -> int:
+        """Copy vectors for ids from a pre-rename store; returns how many were found"""
+        return 0
+    
+    async def load_snapshot(self) -> bool:
+        """Load the latest on-disk snapshot; False if there is none"""
+        return False
+    
+    async def save_snapshot(self, watermark: Optional[str] = None):
+        """Persist the current index to disk"""
+        pass
+    
+    async def adopt_snapshot(self) -> bool:
+        """Switch to a newer snapshot written by another worker"""
+        return False
+    
+    async def flush(self):
+        """Write out any buffered inserts"""
+        pass
+    
+    def get_stats(self) -> Dict:
+        return {"backend": type(self).__name__, "name": self.name, "initialized": self.initialized}
+
+
+class VectorStore:
+    """
+    Numeric ID -> normalized vector, kept for rebuilds and filtered search
+    
+    Rows that came from a snapshot stay in its memory-mapped vectors.npy, so
+    every worker mapping the same snapshot shares those pages; each worker
+    only holds a sorted ID array, a liveness mask and the rows inserted
+    since (the delta) privately.
+    """
+    
+    def __init__(self, dimension: int, dtype):
+        self.dimension = dimension
+        self.dtype = dtype
+        
+        self.base_ids = np.empty(0, dtype="int64")  # sorted
+        self.base_rows = np.empty(0, dtype="int64")  # position of each sorted ID in base_vectors
+        self.base_live = np.empty(0, dtype=bool)
+        self.base_vectors: Optional[np.ndarray] = None
+        self.base_count = 0
+        
+        self.delta: Dict[int, np.ndarray] = {}
+    
+    def set_base(self, numeric_ids: np.ndarray, vectors: np.ndarray, live: Optional[Iterable[int]] = None):
+        """
+        Serve rows from a (memory-mapped) array; delta rows now in it are dropped
+        
+        live limits the base to IDs still present (deletes that happened while
+        the array was being written).
+        """
+        order = np.argsort(numeric_ids, kind="stable")
+        self.base_ids = np.asarray(numeric_ids, dtype="int64")[order]
+        self.base_rows = order.astype("int64")
+        self.base_vectors = vectors
+        self.base_live = np.ones(len(order), dtype=bool)
+        if live is not None:
+            self.base_live = np.isin(self.base_ids, np.fromiter(live, dtype="int64"))
+        self.base_count = int(self.base_live.sum())
+        
+        self.delta = {i: v for i, v in self.delta.items() if self._base_position(i) < 0}
+    
+    def _base_position(self, numeric_id: int) -> int:
+        """Index into base_ids, or -1"""
+        pos = int(np.searchsorted(self.base_ids, numeric_id))
+        if pos < len(self.base_ids) and self.base_ids[pos] == numeric_id:
+            return pos
+        return -1
+    
+    def __len__(self) -> int:
+        return self.base_count + len(self.delta)
+    
+    def __contains__(self, numeric_id: int) -> bool:
+        if numeric_id in self.delta:
+            return True
+        pos = self._base_position(numeric_id)
+        return pos >= 0 and bool(self.base_live[pos])
+    
+    def add(self, numeric_id: int, vector: np.ndarray):
+        self.delta[numeric_id] = vector.astype(self.dtype)
+    
+    def discard(self, numeric_id: int):
+        if self.delta.pop(numeric_id, None) is not None:
+            return
+        pos = self._base_position(numeric_id)
+        if pos >= 0 and self.base_live[pos]:
+            self.base_live[pos] = False
+            self.base_count -= 1
+    
+    def ids(self) -> np.ndarray:
+        """Live IDs, base first"""
+        return np.concatenate([
+            self.base_ids[self.base_live],
+            np.fromiter(self.delta.keys(), dtype="int64", count=len(self.delta))
+        ])
+    
+    def get(self, numeric_ids: Iterable[int]) -> np.ndarray:
+        """float32 [n, dim] copy of the given (live) IDs, in order"""
+        numeric_ids = np.fromiter(numeric_ids, dtype="int64")
+        out = np.empty((len(numeric_ids), self.dimension), dtype="float32")
+        if not len(numeric_ids):
+            return out
+        
+        positions = np.searchsorted(self.base_ids, numeric_ids)
+        positions = np.minimum(positions, max(len(self.base_ids) - 1, 0))
+        in_base = (
+            self.base_ids[positions] == numeric_ids if len(self.base_ids)
+            else np.zeros(len(numeric_ids), dtype=bool)
+        )
+        
+        if in_base.any():
+            out[in_base] = self.base_vectors[self.base_rows[positions[in_base]]]
+        for i in np.flatnonzero(~in_base):
+            out[i] = self.delta[int(numeric_ids[i])]
+        return out
+    
+    def export(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, vectors) of every live row in the storage dtype, for snapshots"""
+        numeric_ids = self.ids()
+        return numeric_ids, self.get(numeric_ids).astype(self.dtype)
+    
+    def get_stats(self) -> Dict:
+        itemsize = np.dtype(self.dtype).itemsize
+        return {
+            "shared_bytes": len(self.base_ids) * self.dimension * (
+                self.base_vectors.dtype.itemsize if self.base_vectors is not None else itemsize
+            ),
+            "private_bytes": len(self.delta) * self.dimension * itemsize + len(self.base_ids) * 17,
+        }
 
 
 class FAISSVectorDB(VectorDB):
-    """FAISS-based vector database (local, file-based)"""
+    """
+    FAISS-based vector database (local, file-based)
+    
+    FAISS_INDEX_TYPE selects flat, ivf_flat, ivf_pq or hnsw. IVF indexes
+    need training, so the DB serves from an exact flat index until
+    FAISS_TRAIN_MIN_VECTORS vectors exist, then trains the IVF index in the
+    background and swaps it in. IVF indexes are retrained the same way once
+    the corpus grows FAISS_REBUILD_GROWTH times past the size they were
+    trained on. A copy of every vector is kept so rebuilds never need Mongo.
+    
+    Deletes call remove_ids on flat and IVF indexes. HNSW cannot remove
+    vectors, so deleted IDs become tombstones that searches exclude with an
+    ID selector (top_k stays top_k however many there are); once they
+    exceed FAISS_COMPACT_TOMBSTONE_RATIO of the index it is rebuilt without
+    them. Numeric IDs come from a monotonic counter and are never reused.
+    
+    With VECTOR_METRIC=ip the indexes use inner product on the normalized
+    vectors, so scores are cosine similarities; l2 keeps the 1/(1+d) scores.
+    
+    FAISS_VECTOR_CODEC compresses what the index and the vector copy hold:
+    fp16 halves both (scalar-quantizer fp16 codes, float16 copies), sq8
+    stores 8-bit codes in the index. sq8 needs per-dimension ranges, so it
+    serves fp16 until FAISS_TRAIN_MIN_VECTORS vectors exist and is retrained
+    on growth like IVF. ivf_pq ignores the codec.
     
-    def __init__(self):
-        super().__init__()
+    Filtered searches (e.g. one user's personal documents) never touch the
+    ANN index: postings on filter_fields give the matching IDs and their
+    stored vectors are scored exactly, so cost follows the subset size.
+    
+    Snapshots (index, id map, vectors, metadata and the Mongo watermark) are
+    written as versioned directories under FAISS_SNAPSHOT_DIR/<name>/ with a
+    CURRENT pointer. The vector copy (vectors.npy) is always memory-mapped,
+    so uvicorn workers share its pages. Of the indexes only IVF can be
+    mapped (its inverted lists are read as OnDiskInvertedLists): an IVF
+    snapshot is served read-only from the mapped file (the base), with
+    inserts going to a small per-worker flat delta index that is searched
+    alongside the base and merged by score, and deletes of base rows
+    becoming tombstones. Once the delta passes FAISS_DELTA_MAX_VECTORS (or
+    a rebuild is due anyway) the snapshot-writing worker rebuilds the
+    index, writes it as a new snapshot and maps it as the new base. Flat
+    and HNSW snapshots load into a private, mutable index per worker. The
+    ID maps, metadata and postings are plain dicts rebuilt from meta.json
+    by every worker, so they cost O(corpus) memory per worker whatever the
+    index type. Only the writer builds; the other workers adopt its
+    snapshots when they appear.
+    """
+    
+    INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+    IVF_TYPES = ("ivf_flat", "ivf_pq")
+    CODECS = ("fp32", "fp16", "sq8")
+    
+    def __init__(self, name: str = "default", filter_fields: Tuple[str, ...] = ()):
+        super().__init__(name, filter_fields)
         self.index = None
         self.id_map = {}  # maps FAISS index to document ID
         self.reverse_map = {}  # maps document ID to FAISS index
         self.metadata_store = {}  # stores metadata for each ID
+        self.postings: Dict[str, Dict[Any, set]] = {field: {} for field in self.filter_fields}
+        
+        self.index_type = settings.FAISS_INDEX_TYPE.lower()
+        if self.index_type not in self.INDEX_TYPES:
+            logger.warning(f"Unknown FAISS_INDEX_TYPE '{self.index_type}', using flat")
+            self.index_type = "flat"
         
+        self.codec = settings.FAISS_VECTOR_CODEC.lower()
+        if self.codec not in self.CODECS:
+            logger.warning(f"Unknown FAISS_VECTOR_CODEC '{self.codec}', using fp32")
+            self.codec = "fp32"
+        self.store_dtype = np.float32 if self.codec == "fp32" else np.float16
+        self.vector_store = VectorStore(self.dimension, self.store_dtype)  # for rebuilds and filtered search
+        
+        self.active_type = "flat"  # type of the index currently serving
+        self.index_metric = self.metric  # metric the serving index was built with
+        self.index_codec = self.codec  # codec the serving index was built with
+        self.trained_size = 0  # vectors in the index when it was last (re)built
+        self.rebuild_task: Optional[asyncio.Task] = None
+        self._rebuild_pending: Optional[List[int]] = None  # IDs inserted while a rebuild runs
+        self._index_lock = asyncio.Lock()  # one rebuild or snapshot write at a time (they share _rebuild_pending)
+        self.rebuilds = 0
+        
+        self.next_id = 0  # next numeric FAISS ID (never reused)
+        self.tombstones = set()  # deleted numeric IDs still present in an HNSW index
+        self._tombstone_selector = (None, None)  # (tombstone set identity, IDSelector) for searches
+        self.deleted = 0
+        
+        self.snapshot_dir = (
+            os.path.join(settings.FAISS_SNAPSHOT_DIR, name) if settings.FAISS_SNAPSHOT_DIR else None
+        )
+        self.snapshot_version: Optional[str] = None
+        self.index_mmapped = False
+        
+        # Shared read-only snapshot index; self.index is then the per-worker delta
+        self.base_index = None
+        self.base_next_id = 0  # numeric IDs below this live in the base
+        self._deleted_since_base = set()  # doc IDs to re-delete when adopting a newer snapshot
+        self._writer_lock = None
+        self._last_adopt_check = 0.0  # non-writers: last time a due rebuild looked for a snapshot
+    
     async def initialize(self):
         """Initialize FAISS index"""
         try:
             if not FAISS_AVAILABLE:
                 raise ImportError("FAISS library not installed")
             
-            # Create FAISS index (L2 distance)
-            self.index = faiss.IndexFlatL2(self.dimension)
-            
-            # Wrap with ID map for string IDs
-            self.index = faiss.IndexIDMap(self.index)
+            # IVF types start flat (and sq8 as fp16) until there is enough data to train on
+            self.active_type = "hnsw" if self.index_type == "hnsw" else "flat"
+            self.index_codec = self._target_codec()
+            self.index = self._build_index(
+                self.active_type,
+                np.empty(0, dtype="int64"),
+                np.empty((0, self.dimension), dtype="float32"),
+                self.index_codec
+            )
             
             self.initialized = True
-            logger.info(f"Initialized FAISS vector DB (dimension={self.dimension})")
+            logger.info(
+                f"Initialized FAISS vector DB (dimension={self.dimension}, "
+                f"type={self.index_type}, serving={self.active_type}, codec={self.index_codec})"
+            )
             
         except Exception as e:
             logger.error(f"Failed to initialize FAISS: {e}")
             raise
     
+    def _build_index(self, index_type: str, numeric_ids: np.ndarray, vectors: np.ndarray, codec: str = "fp32"):
+        """Create, train (if needed) and fill an index - blocking"""
+        qtype = self._sq_type(codec)
+        
+        if index_type in self.IVF_TYPES:
+            # k-means wants ~39 points per centroid
+            nlist = max(1, min(settings.FAISS_NLIST, len(vectors) // 39))
+            quantizer = faiss.IndexFlatIP(self.dimension) if self.metric == "ip" else faiss.IndexFlatL2(self.dimension)
+            
+            if index_type == "ivf_pq":
+                index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, settings.FAISS_PQ_M, 8, self.faiss_metric)
+            elif qtype is not None:
+                index = faiss.IndexIVFScalarQuantizer(quantizer, self.dimension, nlist, qtype, self.faiss_metric)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, self.faiss_metric)
+            
+            index.train(vectors)
+            index.nprobe = settings.FAISS_NPROBE
+            
+        elif index_type == "hnsw":
+            if qtype is not None:
+                hnsw = faiss.IndexHNSWSQ(self.dimension, qtype, settings.FAISS_HNSW_M, self.faiss_metric)
+                hnsw.train(self._sq_training_set(vectors))
+            else:
+                hnsw = faiss.IndexHNSWFlat(self.dimension, settings.FAISS_HNSW_M, self.faiss_metric)
+            hnsw.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+            hnsw.hnsw.efSearch = settings.FAISS_EF_SEARCH
+            
+            # Wrap with ID map for string IDs
+            index = faiss.IndexIDMap(hnsw)
+            
+        elif qtype is not None:
+            # Exact search over scalar-quantized codes
+            flat = faiss.IndexScalarQuantizer(self.dimension, qtype, self.faiss_metric)
+            flat.train(self._sq_training_set(vectors))
+            index = faiss.IndexIDMap(flat)
+            
+        else:
+            # Create exact FAISS index, wrapped with ID map for string IDs
+            flat = faiss.IndexFlatIP(self.dimension) if self.metric == "ip" else faiss.IndexFlatL2(self.dimension)
+            index = faiss.IndexIDMap(flat)
+        
+        if len(vectors):
+            index.add_with_ids(vectors, numeric_ids)
+        
+        return index
+    
+    @property
+    def faiss_metric(self) -> int:
+        return faiss.METRIC_INNER_PRODUCT if self.metric == "ip" else faiss.METRIC_L2
+    
+    @staticmethod
+    def _sq_type(codec: str):
+        """Scalar quantizer type for a codec (None = raw float32)"""
+        if codec == "fp16":
+            return faiss.ScalarQuantizer.QT_fp16
+        if codec == "sq8":
+            return faiss.ScalarQuantizer.QT_8bit
+        return None
+    
+    def _sq_training_set(self, vectors: np.ndarray) -> np.ndarray:
+        """fp16 needs no ranges; with no data yet, train on the unit-vector bounds"""
+        if len(vectors):
+            return vectors
+        return np.stack([-np.ones(self.dimension), np.ones(self.dimension)]).astype("float32")
+    
+    def _target_type(self) -> str:
+        """Index type to serve at the current corpus size"""
+        if self.index_type in self.IVF_TYPES and len(self.vector_store) < settings.FAISS_TRAIN_MIN_VECTORS:
+            return "flat"
+        return self.index_type
+    
+    def _target_codec(self) -> str:
+        """Codec to serve at the current corpus size (sq8 ranges need data)"""
+        if self.codec == "sq8" and len(self.vector_store) < settings.FAISS_TRAIN_MIN_VECTORS:
+            return "fp16"
+        return self.codec
+    
+    def _needs_rebuild(self) -> bool:
+        if self.rebuild_task is not None and not self.rebuild_task.done():
+            return False
+        
+        target = self._target_type()
+        codec = self._target_codec()
+        if target != self.active_type or self.index_metric != self.metric or codec != self.index_codec:
+            # Not trained yet, or a snapshot was written under another type/metric/codec
+            return True
+        
+        if self.tombstones and self.tombstone_ratio >= settings.FAISS_COMPACT_TOMBSTONE_RATIO:
+            return True
+        
+        if self.base_index is not None and self.index.ntotal >= settings.FAISS_DELTA_MAX_VECTORS:
+            # Fold the per-worker delta into a new shared base
+            return True
+        
+        return (
+            (target in self.IVF_TYPES or codec == "sq8")
+            and len(self.vector_store) >= settings.FAISS_REBUILD_GROWTH * max(self.trained_size, 1)
+        )
+    
+    async def rebuild(self):
+        """Rebuild the configured index now (waits for a running rebuild instead)"""
+        if self.rebuild_task is not None and not self.rebuild_task.done():
+            await self.rebuild_task
+            return
+        
+        await self._rebuild()
+    
+    async def _rebuild(self):
+        """Rebuild the configured index from the stored vectors off the event loop"""
+        from app.services.inference_executor import inference_executor
+        
+        if self.snapshot_dir and not self._is_snapshot_writer():
+            # Only the writer builds; the others map what it publishes instead
+            # of each repeating the O(N) build into private memory
+            await self.adopt_snapshot()
+            return
+        
+        async with self._index_lock:
+            try:
+                target = self._target_type()
+                codec = self._target_codec()
+                
+                numeric_ids = self.vector_store.ids()
+                vectors = self.vector_store.get(numeric_ids)
+                meta = self._snapshot_meta(active_type=target, codec=codec, trained_size=len(numeric_ids), tombstones=[])
+                self._rebuild_pending = []
+                
+                started = time.perf_counter()
+                index = await inference_executor.run_index(self._build_index, target, numeric_ids, vectors, codec)
+                
+                published = None
+                if self.snapshot_dir:
+                    # Publish and serve the result memory-mapped so other workers can share it
+                    published = await inference_executor.run_index(
+                        self._publish_snapshot, index, meta, numeric_ids, vectors.astype(self.store_dtype)
+                    )
+                
+                # Catch up on inserts that arrived while training...
+                pending = [i for i in self._rebuild_pending if i in self.vector_store]
+                # ...and on deletes
+                removed = [int(i) for i in numeric_ids if int(i) not in self.vector_store]
+                
+                if published is not None and published[1] is not None:
+                    version, base, base_vectors = published
+                    self._serve_base(base, meta["next_id"], codec, pending)
+                    self.vector_store.set_base(numeric_ids, base_vectors, live=self.id_map.keys())
+                    self.tombstones = set(removed)  # the mapped base is read-only
+                    self.snapshot_version = version
+                else:
+                    if pending:
+                        index.add_with_ids(self.vector_store.get(pending), np.array(pending, dtype="int64"))
+                    
+                    tombstones = set()
+                    if removed:
+                        if target == "hnsw":
+                            tombstones = set(removed)
+                        else:
+                            index.remove_ids(np.array(removed, dtype="int64"))
+                    
+                    self.index = index
+                    self.base_index = None
+                    self.base_next_id = 0
+                    self.index_mmapped = False
+                    self.tombstones = tombstones
+                    if published is not None:
+                        self.snapshot_version = published[0]
+                
+                self._deleted_since_base = set()
+                self.active_type = target
+                self.index_metric = self.metric
+                self.index_codec = codec
+                self.trained_size = len(numeric_ids) + len(pending)
+                self.rebuilds += 1
+                
+                logger.info(
+                    f"Rebuilt FAISS index as {target}/{codec} with {self.trained_size} vectors "
+                    f"in {time.perf_counter() - started:.1f}s (shared={self.base_index is not None})"
+                )
+                
+            except Exception as e:
+                logger.error(f"Failed to rebuild FAISS index: {e}")
+                raise
+            finally:
+                self._rebuild_pending = None
+    
+    async def _rebuild_in_background(self):
+        try:
+            await self._rebuild()
+        except Exception:
+            pass  # Logged in _rebuild(); keep serving from the current index
+    
+    def _schedule_rebuild(self):
+        if not self._needs_rebuild():
+            return
+        
+        if self.snapshot_dir and not self._is_snapshot_writer():
+            # Waiting on the writer: look for its snapshot at most once per poll interval
+            now = time.monotonic()
+            if now - self._last_adopt_check < settings.INDEX_SYNC_POLL_INTERVAL_S:
+                return
+            self._last_adopt_check = now
+        
+        self.rebuild_task = asyncio.create_task(self._rebuild_in_background())
+    
     async def insert(self, ids: List[str], embeddings: np.ndarray, metadata: Optional[List[dict]] = None):
         """Insert vectors into FAISS"""
         try:
@@ -77,16 +575,21 @@ class FAISSVectorDB(VectorDB):
                 await self.initialize()
             
             # Convert embeddings to float32
-            embeddings = embeddings.astype('float32')
+            embeddings = np.array(embeddings, dtype='float32')
             
             # Normalize embeddings for cosine similarity
             faiss.normalize_L2(embeddings)
             
+            # Re-inserting a document replaces its vector
+            existing = [doc_id for doc_id in ids if doc_id in self.reverse_map]
+            if existing:
+                self._remove(existing)
+            
             # Generate numeric IDs
-            start_idx = len(self.id_map)
-            numeric_ids = np.arange(start_idx, start_idx + len(ids), dtype='int64')
+            numeric_ids = np.arange(self.next_id, self.next_id + len(ids), dtype='int64')
+            self.next_id += len(ids)
             
-            # Add to index
+            # Add to index (the delta when serving a snapshot base)
             self.index.add_with_ids(embeddings, numeric_ids)
             
             # Update mappings
@@ -94,118 +597,746 @@ class FAISSVectorDB(VectorDB):
                 numeric_id = int(numeric_ids[i])
                 self.id_map[numeric_id] = doc_id
                 self.reverse_map[doc_id] = numeric_id
+                self.vector_store.add(numeric_id, embeddings[i])
                 
                 if metadata:
                     self.metadata_store[doc_id] = metadata[i]
+                    self._add_postings(numeric_id, metadata[i])
+            
+            if self._rebuild_pending is not None:
+                self._rebuild_pending.extend(int(i) for i in numeric_ids)
             
             logger.info(f"Inserted {len(ids)} vectors into FAISS")
             
+            self._schedule_rebuild()
+            
         except Exception as e:
             logger.error(f"Failed to insert into FAISS: {e}")
             raise
     
-    async def search(self, query_embedding: np.ndarray, top_k: int = 10) -> List[Tuple[str, float]]:
+    def _search_params(
+        self,
+        index_type: str,
+        top_k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        sel=None
+    ):
+        """Per-query search parameters for an index type (sel excludes IDs)"""
+        if index_type in self.IVF_TYPES:
+            return faiss.SearchParametersIVF(nprobe=nprobe or settings.FAISS_NPROBE, sel=sel)
+        if index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=max(ef_search or settings.FAISS_EF_SEARCH, top_k), sel=sel)
+        if sel is not None:
+            return faiss.SearchParameters(sel=sel)
+        return None
+    
+    def _tombstone_filter(self):
+        """IDSelector skipping tombstoned IDs, rebuilt only when the tombstones change"""
+        key = (id(self.tombstones), len(self.tombstones))  # tombstones only grow until replaced
+        if self._tombstone_selector[0] != key:
+            batch = faiss.IDSelectorBatch(np.fromiter(self.tombstones, dtype="int64", count=len(self.tombstones)))
+            self._tombstone_selector = (key, faiss.IDSelectorNot(batch))
+        return self._tombstone_selector[1]
+    
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
         """Search FAISS for similar vectors"""
+        results = await self.search_batch(
+            np.asarray(query_embedding).reshape(1, -1),
+            top_k=top_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=filters
+        )
+        return results[0] if results else []
+    
+    async def search_batch(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search many queries with one FAISS call (or one matmul when filtered)"""
         try:
             if not self.initialized:
                 await self.initialize()
             
             # Convert to float32 and normalize
-            import faiss
-            query_embedding = query_embedding.astype('float32').reshape(1, -1)
-            faiss.normalize_L2(query_embedding)
+            queries = np.array(queries, dtype='float32').reshape(-1, self.dimension)
+            faiss.normalize_L2(queries)
             
-            # Search
-            distances, indices = self.index.search(query_embedding, top_k)
+            if filters:
+                return self._search_subset(queries, top_k, self._match(filters))
             
-            # Convert to document IDs
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx != -1 and int(idx) in self.id_map:
-                    doc_id = self.id_map[int(idx)]
-                    score = float(1 / (1 + distances[0][i]))  # Convert distance to similarity
-                    results.append((doc_id, score))
+            if self.base_index is None:
+                return self._search_index(self.index, self.active_type, queries, top_k, nprobe, ef_search)
             
-            return results
+            # Shared base + this worker's delta, merged by score
+            base = self._search_index(self.base_index, self.active_type, queries, top_k, nprobe, ef_search)
+            delta = self._search_index(self.index, "flat", queries, top_k, nprobe, ef_search)
+            return [
+                sorted(base_hits + delta_hits, key=lambda hit: hit[1], reverse=True)[:top_k]
+                for base_hits, delta_hits in zip(base, delta)
+            ]
             
         except Exception as e:
             logger.error(f"Failed to search FAISS: {e}")
-            return []
+            return [[] for _ in range(len(queries))]
+    
+    def _search_index(
+        self,
+        index,
+        index_type: str,
+        queries: np.ndarray,
+        top_k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> List[List[Tuple[str, float]]]:
+        """One FAISS search call, mapped back to (document ID, score)"""
+        if not index.ntotal:
+            return [[] for _ in range(len(queries))]
+        
+        k = min(top_k, int(index.ntotal))
+        
+        # Tombstones live in the base (or in an HNSW index without one); skip them inside the search
+        sel = None
+        if self.tombstones and (self.base_index is None or index is self.base_index):
+            sel = self._tombstone_filter()
+        
+        # Search
+        params = self._search_params(index_type, k, nprobe, ef_search, sel)
+        if params is None:
+            distances, indices = index.search(queries, k)
+        else:
+            distances, indices = index.search(queries, k, params=params)
+        
+        # Convert to document IDs
+        output = []
+        for row_distances, row_indices in zip(distances, indices):
+            results = []
+            for distance, idx in zip(row_distances, row_indices):
+                if idx != -1 and int(idx) in self.id_map:
+                    results.append((self.id_map[int(idx)], self._to_score(distance, self.index_metric)))
+            output.append(results[:top_k])
+        
+        return output
+    
+    @staticmethod
+    def _allowed(value: Any) -> set:
+        """Filter value -> set of accepted values (lists mean any-of)"""
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return set(value)
+        return {value}
+    
+    def _add_postings(self, numeric_id: int, metadata: Optional[dict]):
+        for field, posting in self.postings.items():
+            value = (metadata or {}).get(field)
+            posting.setdefault(value, set()).add(numeric_id)
+    
+    def _remove_postings(self, numeric_id: int, metadata: Optional[dict]):
+        for field, posting in self.postings.items():
+            value = (metadata or {}).get(field)
+            ids = posting.get(value)
+            if ids is not None:
+                ids.discard(numeric_id)
+                if not ids:
+                    del posting[value]
+    
+    def _match(self, filters: Dict[str, Any]) -> Iterable[int]:
+        """Numeric IDs whose metadata satisfies every filter"""
+        candidates = None
+        remaining = {}
+        
+        # Intersect postings
+        for field, value in filters.items():
+            if field not in self.postings:
+                remaining[field] = self._allowed(value)
+                continue
+            
+            ids = set()
+            for allowed in self._allowed(value):
+                ids |= self.postings[field].get(allowed, set())
+            candidates = ids if candidates is None else candidates & ids
+        
+        if candidates is None:
+            # No indexed field - scan metadata
+            candidates = self.id_map.keys()
+        
+        if remaining:
+            candidates = [
+                numeric_id for numeric_id in candidates
+                if all(
+                    self.metadata_store.get(self.id_map[numeric_id], {}).get(field) in allowed
+                    for field, allowed in remaining.items()
+                )
+            ]
+        
+        return candidates
+    
+    def _search_subset(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        numeric_ids: Iterable[int]
+    ) -> List[List[Tuple[str, float]]]:
+        """Exact search of [n, dim] queries over a subset of stored vectors"""
+        numeric_ids = [i for i in numeric_ids if i in self.vector_store]
+        if not numeric_ids:
+            return [[] for _ in range(len(queries))]
+        
+        vectors = self.vector_store.get(numeric_ids)
+        similarities = queries @ vectors.T  # [n_queries, n_subset]
+        
+        k = min(top_k, len(numeric_ids))
+        output = []
+        for row in similarities:
+            best = np.argpartition(-row, k - 1)[:k]
+            best = best[np.argsort(-row[best])]
+            
+            results = []
+            for i in best:
+                if self.metric == "ip":
+                    score = self._to_score(row[i], "ip")
+                else:
+                    # Unit vectors: squared L2 = 2 - 2 cos
+                    score = self._to_score(max(2.0 - 2.0 * float(row[i]), 0.0), "l2")
+                results.append((self.id_map[numeric_ids[i]], score))
+            output.append(results)
+        
+        return output
+    
+    def _remove(self, ids: List[str]) -> int:
+        """Drop documents from the maps and the index (or tombstone them)"""
+        numeric_ids = []
+        for doc_id in ids:
+            if doc_id in self.reverse_map:
+                numeric_id = self.reverse_map.pop(doc_id)
+                del self.id_map[numeric_id]
+                self.vector_store.discard(numeric_id)
+                self._remove_postings(numeric_id, self.metadata_store.pop(doc_id, None))
+                numeric_ids.append(numeric_id)
+                self._deleted_since_base.add(doc_id)
+        
+        if not numeric_ids:
+            return 0
+        
+        removed = len(numeric_ids)
+        self.deleted += removed
+        
+        if self.base_index is not None:
+            # The mapped base is read-only - filter at search time until the next rebuild
+            self.tombstones.update(i for i in numeric_ids if i < self.base_next_id)
+            numeric_ids = [i for i in numeric_ids if i >= self.base_next_id]
+            if numeric_ids:
+                self.index.remove_ids(np.array(numeric_ids, dtype="int64"))
+        elif self.active_type == "hnsw":
+            # HNSW graphs can't drop nodes - filter at search time until compaction
+            self.tombstones.update(numeric_ids)
+        else:
+            self.index.remove_ids(np.array(numeric_ids, dtype="int64"))
+        
+        return removed
     
     async def delete(self, ids: List[str]):
         """Delete vectors from FAISS"""
         try:
-            # FAISS doesn't support efficient deletion
-            # For production, rebuild index without deleted IDs
-            for doc_id in ids:
-                if doc_id in self.reverse_map:
-                    numeric_id = self.reverse_map[doc_id]
-                    del self.id_map[numeric_id]
-                    del self.reverse_map[doc_id]
-                    if doc_id in self.metadata_store:
-                        del self.metadata_store[doc_id]
-            
-            logger.info(f"Marked {len(ids)} vectors for deletion in FAISS")
+            if not self.initialized:
+                await self.initialize()
+            
+            removed = self._remove(ids)
+            
+            logger.info(f"Deleted {removed} vectors from FAISS '{self.name}'")
+            
+            self._schedule_rebuild()
             
         except Exception as e:
             logger.error(f"Failed to delete from FAISS: {e}")
+    
+    async def compact(self):
+        """Rebuild now to purge tombstones"""
+        await self.rebuild()
+    
+    @property
+    def tombstone_ratio(self) -> float:
+        ntotal = int(self.index.ntotal) if self.index is not None else 0
+        if self.base_index is not None:
+            ntotal += int(self.base_index.ntotal)
+        return len(self.tombstones) / ntotal if ntotal else 0.0
+    
+    def contains(self, doc_id: str) -> bool:
+        return doc_id in self.reverse_map
+    
+    def doc_ids(self) -> List[str]:
+        return list(self.reverse_map)
+    
+    @staticmethod
+    def _delta_codec(codec: str) -> str:
+        # The delta is never trained, so sq8 ranges aren't available
+        return "fp16" if codec == "sq8" else codec
+    
+    def _serve_base(self, base, base_next_id: int, codec: str, delta_ids: List[int]):
+        """Serve a mapped snapshot index as the base, with a fresh delta holding delta_ids"""
+        self.base_index = base
+        self.base_next_id = base_next_id
+        self.index = self._build_index(
+            "flat",
+            np.array(delta_ids, dtype="int64"),
+            self.vector_store.get(delta_ids),
+            self._delta_codec(codec)
+        )
+        self.index_mmapped = True
+    
+    def _is_snapshot_writer(self) -> bool:
+        """
+        Whether this process writes snapshots for the collection
+        
+        The first worker to take an exclusive lock on the snapshot directory
+        keeps it for its lifetime; the others adopt what it publishes rather
+        than each writing (and mapping) their own copy.
+        """
+        if not self.snapshot_dir:
+            return False
+        if self._writer_lock is not None:
+            return True
+        if fcntl is None:
+            return True  # No flock (Windows): assume a single worker
+        
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        handle = open(os.path.join(self.snapshot_dir, ".writer.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        
+        self._writer_lock = handle
+        logger.info(f"This worker writes FAISS snapshots for '{self.name}'")
+        return True
+    
+    def _read_current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.snapshot_dir, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def _snapshot_meta(self, **overrides) -> Dict:
+        meta = {
+            "name": self.name,
+            "dimension": self.dimension,
+            "index_type": self.index_type,
+            "active_type": self.active_type,
+            "metric": self.index_metric,
+            "codec": self.index_codec,
+            "trained_size": self.trained_size,
+            "watermark": self.watermark,
+            "created_at": datetime.utcnow().isoformat(),
+            "next_id": self.next_id,
+            "tombstones": sorted(self.tombstones),
+            "id_map": {str(k): v for k, v in self.id_map.items()},
+            "metadata": dict(self.metadata_store),
+        }
+        meta.update(overrides)
+        return meta
+    
+    async def load_snapshot(self) -> bool:
+        """Load the CURRENT snapshot (vectors and IVF lists mapped); False if none is usable"""
+        from app.services.inference_executor import inference_executor
+        
+        if not self.snapshot_dir or not FAISS_AVAILABLE:
+            return False
+        
+        version = self._read_current_version()
+        if not version:
+            return False
+        
+        try:
+            started = time.perf_counter()
+            loaded = await inference_executor.run_index(self._read_snapshot, os.path.join(self.snapshot_dir, version))
+            if loaded is None:
+                return False
+            
+            self._apply_snapshot(version, loaded)
+            self.initialized = True
+            self.snapshot_loaded = True
+            
+            logger.info(
+                f"Loaded FAISS snapshot {self.name}/{version}: {len(self.id_map)} vectors "
+                f"({self.active_type}, shared={self.base_index is not None}) "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+            
+            self._schedule_rebuild()
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable FAISS snapshot {self.name}/{version}: {e}")
+            return False
+    
+    def _apply_snapshot(self, version: str, loaded: Tuple):
+        """Replace all in-memory state with a snapshot read by _read_snapshot"""
+        index, mmapped, meta, numeric_ids, vectors = loaded
+        
+        self.active_type = meta["active_type"]
+        self.index_metric = meta.get("metric", "l2")
+        self.index_codec = meta.get("codec", "fp32")
+        self.trained_size = meta["trained_size"]
+        self.watermark = meta.get("watermark")
+        self.snapshot_version = version
+        
+        self.id_map = {int(k): v for k, v in meta["id_map"].items()}
+        self.tombstones = set(meta.get("tombstones", []))
+        self.next_id = meta.get("next_id", max(self.id_map, default=-1) + 1)
+        self.reverse_map = {doc_id: numeric_id for numeric_id, doc_id in self.id_map.items()}
+        self.metadata_store = meta.get("metadata", {})
+        self.postings = {field: {} for field in self.filter_fields}
+        for numeric_id, doc_id in self.id_map.items():
+            self._add_postings(numeric_id, self.metadata_store.get(doc_id))
+        self.vector_store = VectorStore(self.dimension, self.store_dtype)
+        self.vector_store.set_base(numeric_ids, vectors)
+        self._deleted_since_base = set()
+        
+        if mmapped:
+            self._serve_base(index, self.next_id, self.index_codec, [])
+        else:
+            # Flat / HNSW (or an IVF file that failed to map) - serve a private copy
+            self.index = index
+            self.base_index = None
+            self.base_next_id = 0
+            self.index_mmapped = False
+    
+    async def adopt_snapshot(self) -> bool:
+        """
+        Switch to a newer snapshot published by the writer worker
+        
+        Documents this worker indexed that the snapshot lacks are re-inserted
+        into the delta, and documents it deleted since its last base are
+        deleted again. Returns False if there was nothing newer to adopt.
+        """
+        from app.services.inference_executor import inference_executor
+        
+        if not self.snapshot_dir or not self.initialized or self._is_snapshot_writer():
+            return False
+        
+        version = self._read_current_version()
+        if not version or version == self.snapshot_version:
+            return False
+        
+        try:
+            loaded = await inference_executor.run_index(self._read_snapshot, os.path.join(self.snapshot_dir, version))
+            if loaded is None:
+                return False
+            
+            reverse_map, vector_store = self.reverse_map, self.vector_store
+            metadata_store, deleted = self.metadata_store, self._deleted_since_base
+            
+            self._apply_snapshot(version, loaded)
+            
+            missing = [doc_id for doc_id in reverse_map if doc_id not in self.reverse_map]
+            if missing:
+                await self.insert(
+                    ids=missing,
+                    embeddings=vector_store.get(reverse_map[doc_id] for doc_id in missing),
+                    metadata=[metadata_store.get(doc_id) for doc_id in missing]
+                )
+            
+            stale = [doc_id for doc_id in deleted if doc_id in self.reverse_map]
+            if stale:
+                self._remove(stale)
+            
+            logger.info(
+                f"Adopted FAISS snapshot {self.name}/{version} "
+                f"({len(missing)} local inserts, {len(stale)} local deletes re-applied)"
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to adopt FAISS snapshot {self.name}/{version}: {e}")
+            return False
+    
+    def _read_snapshot(self, path: str):
+        """Read one snapshot directory - blocking"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        
+        if meta.get("dimension") != self.dimension:
+            logger.warning(f"Snapshot {path} has dimension {meta.get('dimension')}, expected {self.dimension}")
+            return None
+        
+        index_path = os.path.join(path, "index.faiss")
+        index, mmapped = None, False
+        if meta.get("active_type") in self.IVF_TYPES:
+            # Flat and HNSW read with IO_FLAG_MMAP still land in private memory;
+            # only IVF inverted lists are actually mapped
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                mmapped = True
+            except Exception as e:
+                logger.warning(f"Could not map {index_path}, loading a private copy: {e}")
+        if index is None:
+            index = faiss.read_index(index_path)
+        
+        numeric_ids = np.load(os.path.join(path, "ids.npy"))
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        
+        return index, mmapped, meta, numeric_ids, vectors
+    
+    async def save_snapshot(self, watermark: Optional[str] = None):
+        """Write a new snapshot version, point CURRENT at it and serve it mapped"""
+        from app.services.inference_executor import inference_executor
+        
+        if not self.snapshot_dir or not self.initialized:
+            return
+        
+        if watermark is not None:
+            self.watermark = watermark
+        
+        if not self._is_snapshot_writer():
+            # Another worker publishes; pick up its latest instead
+            await self.adopt_snapshot()
+            return
+        
+        if self.rebuild_task is not None and not self.rebuild_task.done():
+            await self.rebuild_task
+        
+        async with self._index_lock:
+            try:
+                numeric_ids, vectors = self.vector_store.export()
+                meta = self._snapshot_meta()
+                self._rebuild_pending = []
+                
+                if self.base_index is None:
+                    index = faiss.clone_index(self.index)
+                else:
+                    # Fold the delta into a copy of the base
+                    delta_ids = np.fromiter(self.vector_store.delta.keys(), dtype="int64", count=len(self.vector_store.delta))
+                    index, meta["tombstones"] = await inference_executor.run_index(
+                        self._fold_delta, delta_ids, self.vector_store.get(delta_ids), sorted(self.tombstones)
+                    )
+                
+                version, base, base_vectors = await inference_executor.run_index(
+                    self._publish_snapshot, index, meta, numeric_ids, vectors
+                )
+                self.snapshot_version = version
+                
+                if base is not None:
+                    # Inserts and deletes that landed while writing stay in the new delta / tombstones
+                    pending = [i for i in self._rebuild_pending if i in self.vector_store]
+                    self._serve_base(base, meta["next_id"], self.index_codec, pending)
+                    self.vector_store.set_base(numeric_ids, base_vectors, live=self.id_map.keys())
+                    self.tombstones = set(meta["tombstones"]) | {
+                        int(i) for i in numeric_ids if int(i) not in self.vector_store
+                    }
+                    self._deleted_since_base = set()
+                
+                logger.info(f"Saved FAISS snapshot {self.name}/{version} ({len(numeric_ids)} vectors)")
+                
+            except Exception as e:
+                logger.error(f"Failed to save FAISS snapshot {self.name}: {e}")
+            finally:
+                self._rebuild_pending = None
+    
+    def _fold_delta(self, delta_ids: np.ndarray, delta_vectors: np.ndarray, tombstones: List[int]):
+        """In-memory copy of the base with the delta added and tombstones removed - blocking"""
+        # clone_index can't copy mmapped IVF lists (OnDiskInvertedLists); a plain
+        # read of the base's snapshot file gives ordinary in-memory lists
+        index = faiss.read_index(os.path.join(self.snapshot_dir, self.snapshot_version, "index.faiss"))
+        if len(delta_ids):
+            index.add_with_ids(delta_vectors, delta_ids)
+        
+        if tombstones and self.active_type != "hnsw":
+            index.remove_ids(np.array(tombstones, dtype="int64"))
+            tombstones = []
+        
+        return index, tombstones
+    
+    def _publish_snapshot(self, index, meta: Dict, numeric_ids: np.ndarray, vectors: np.ndarray):
+        """Write a snapshot and map it back; (version, base or None, vectors) - blocking"""
+        version = self._write_snapshot(index, meta, numeric_ids, vectors)
+        if meta["active_type"] not in self.IVF_TYPES:
+            return version, None, None  # keeps serving the private index it just wrote
+        
+        loaded = self._read_snapshot(os.path.join(self.snapshot_dir, version))
+        if loaded is None or not loaded[1]:
+            return version, None, None
+        return version, loaded[0], loaded[4]
+    
+    def _write_snapshot(self, index, meta: Dict, numeric_ids: np.ndarray, vectors: np.ndarray) -> str:
+        """Write to a temp dir, rename into place, then swap CURRENT - blocking"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        
+        current = self._read_current_version()
+        number = int(current[1:]) + 1 if current and current[1:].isdigit() else 1
+        version = f"v{number:06d}"
+        
+        tmp_dir = os.path.join(self.snapshot_dir, f".tmp-{version}-{os.getpid()}")
+        os.makedirs(tmp_dir, exist_ok=True)
+        
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+        np.save(os.path.join(tmp_dir, "ids.npy"), numeric_ids)
+        np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, default=str)
+        
+        os.replace(tmp_dir, os.path.join(self.snapshot_dir, version))
+        
+        pointer = os.path.join(self.snapshot_dir, f"CURRENT.{os.getpid()}.tmp")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.snapshot_dir, "CURRENT"))
+        
+        # Prune old versions
+        versions = sorted(d for d in os.listdir(self.snapshot_dir) if d.startswith("v"))
+        for old in versions[:-max(1, settings.FAISS_SNAPSHOT_KEEP)]:
+            shutil.rmtree(os.path.join(self.snapshot_dir, old), ignore_errors=True)
+        
+        return version
+    
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        stats.update({
+            "index_type": self.index_type,
+            "serving_type": self.active_type,
+            "metric": self.index_metric,
+            "codec": self.index_codec,
+            "vector_store": self.vector_store.get_stats(),
+            "ntotal": int(self.index.ntotal) if self.index is not None else 0,
+            "base_ntotal": int(self.base_index.ntotal) if self.base_index is not None else 0,
+            "shared": self.base_index is not None,
+            "snapshot_writer": self._writer_lock is not None,
+            "live": len(self.id_map),
+            "tombstones": len(self.tombstones),
+            "tombstone_ratio": round(self.tombstone_ratio, 4),
+            "deleted": self.deleted,
+            "next_id": self.next_id,
+            "postings": {field: len(posting) for field, posting in self.postings.items()},
+            "trained_size": self.trained_size,
+            "rebuilding": self.rebuild_task is not None and not self.rebuild_task.done(),
+            "rebuilds": self.rebuilds,
+            "snapshot_version": self.snapshot_version,
+            "mmapped": self.index_mmapped,
+            "watermark": self.watermark,
+        })
+        if self.active_type in self.IVF_TYPES:
+            stats["nlist"] = int((self.base_index if self.base_index is not None else self.index).nlist)
+        return stats
 
 
 class MilvusVectorDB(VectorDB):
-    """Milvus-based vector database (production-ready)"""
+    """
+    Milvus-based vector database (production-ready)
+    
+    Inserts go to a write buffer that is sent as one collection.insert when
+    it reaches MILVUS_INSERT_BUFFER_SIZE rows or MILVUS_INSERT_FLUSH_INTERVAL_MS
+    after the first buffered row, whichever comes first. Buffered rows are not
+    searchable until then. A failed write keeps its rows and retries on a
+    timer that doubles each time; after MILVUS_INSERT_MAX_RETRIES failures in
+    a row the buffered rows are dropped (counted in rows_dropped). flush()
+    drains the buffer and seals segments; it runs on shutdown.
     
-    def __init__(self):
-        super().__init__()
-        self.collection_name = "renova_embeddings"
+    pymilvus is synchronous, so every RPC runs on the vector DB pool of the
+    inference executor. All instances share one connection alias; the gRPC
+    channel is opened once per process and reused.
+    
+    Each DB has its own renova_<name> collection. A new or empty collection
+    is backfilled from the Mongo embeddings at startup; documents stored
+    without one are copied from the old shared renova_embeddings collection
+    if it exists. Rows are written with upsert, so workers backfilling at
+    the same time don't duplicate primary keys.
+    """
+    
+    persistent = True
+    connection_alias = "renova"
+    legacy_collection_name = "renova_embeddings"
+    
+    def __init__(self, name: str = "default", filter_fields: Tuple[str, ...] = ()):
+        super().__init__(name, filter_fields)
+        self.collection_name = f"renova_{name}"
         self.collection = None
+        self._init_lock = asyncio.Lock()
         
+        # Write buffer
+        self._buffer_ids: List[str] = []
+        self._buffer_embeddings: List[List[float]] = []
+        self._buffer_metadata: List[dict] = []
+        self._flush_timer: Optional[asyncio.Task] = None
+        self._write_tasks = set()
+        self._write_lock = asyncio.Lock()
+        self._write_failures = 0  # consecutive
+        
+        # Metrics
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.rows_dropped = 0
+    
     async def initialize(self):
         """Initialize Milvus connection"""
-        try:
-            from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType
+        from app.services.inference_executor import inference_executor
+        
+        async with self._init_lock:
+            if self.initialized:
+                return
             
-            # Connect to Milvus
+            try:
+                self.collection = await inference_executor.run_vector_db(self._open_collection)
+                
+                self.initialized = True
+                logger.info(f"Initialized Milvus vector DB: {self.collection_name}")
+                
+            except Exception as e:
+                logger.error(f"Failed to initialize Milvus: {e}")
+                raise
+    
+    def _open_collection(self):
+        """Blocking connect + collection setup (runs on the vector DB pool)"""
+        from pymilvus import connections, utility, Collection, FieldSchema, CollectionSchema, DataType
+        
+        # Reuse the process-wide connection
+        if not connections.has_connection(self.connection_alias):
             connections.connect(
-                alias="default",
+                alias=self.connection_alias,
                 host=settings.MILVUS_HOST,
                 port=settings.MILVUS_PORT
             )
+        
+        # Define schema
+        fields = [
+            FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=100),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dimension),
+            FieldSchema(name="metadata", dtype=DataType.JSON)
+        ]
+        schema = CollectionSchema(fields, description="ReNova embeddings")
+        
+        # Create or load collection
+        if utility.has_collection(self.collection_name, using=self.connection_alias):
+            collection = Collection(self.collection_name, using=self.connection_alias)
+        else:
+            collection = Collection(self.collection_name, schema, using=self.connection_alias)
             
-            # Define schema
-            fields = [
-                FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=100),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dimension),
-                FieldSchema(name="metadata", dtype=DataType.JSON)
-            ]
-            schema = CollectionSchema(fields, description="ReNova embeddings")
-            
-            # Create or load collection
-            from pymilvus import utility
-            if utility.has_collection(self.collection_name):
-                self.collection = Collection(self.collection_name)
-            else:
-                self.collection = Collection(self.collection_name, schema)
-                
-                # Create index
-                index_params = {
-                    "index_type": "IVF_FLAT",
-                    "metric_type": "L2",
-                    "params": {"nlist": 128}
-                }
-                self.collection.create_index("embedding", index_params)
-            
-            # Load collection
-            self.collection.load()
-            
-            self.initialized = True
-            logger.info(f"Initialized Milvus vector DB: {self.collection_name}")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize Milvus: {e}")
-            raise
+            # Create index
+            index_params = {
+                "index_type": "IVF_FLAT",
+                "metric_type": self.milvus_metric,
+                "params": {"nlist": 128}
+            }
+            collection.create_index("embedding", index_params)
+        
+        # Load collection
+        collection.load()
+        return collection
     
     async def insert(self, ids: List[str], embeddings: np.ndarray, metadata: Optional[List[dict]] = None):
-        """Insert vectors into Milvus"""
+        """Buffer vectors for Milvus; written by size or time"""
         try:
             if not self.initialized:
                 await self.initialize()
@@ -214,64 +1345,275 @@ class MilvusVectorDB(VectorDB):
             if metadata is None:
                 metadata = [{}] * len(ids)
             
-            data = [
-                ids,
-                embeddings.tolist(),
-                metadata
-            ]
+            self._buffer_ids.extend(ids)
+            self._buffer_embeddings.extend(self._normalize(embeddings).tolist())
+            self._buffer_metadata.extend(self._clean_metadata(m) for m in metadata)
             
-            # Insert
-            self.collection.insert(data)
-            self.collection.flush()
+            # While writes are failing, only the backoff timer retries
+            if len(self._buffer_ids) >= settings.MILVUS_INSERT_BUFFER_SIZE and not self._write_failures:
+                task = asyncio.create_task(self._write_buffer())
+                self._write_tasks.add(task)
+                task.add_done_callback(self._write_tasks.discard)
+            elif self._flush_timer is None or self._flush_timer.done():
+                self._flush_timer = asyncio.create_task(self._flush_after_interval())
             
-            logger.info(f"Inserted {len(ids)} vectors into Milvus")
+            logger.info(f"Buffered {len(ids)} vectors for Milvus ({len(self._buffer_ids)} pending)")
             
         except Exception as e:
             logger.error(f"Failed to insert into Milvus: {e}")
             raise
     
-    async def search(self, query_embedding: np.ndarray, top_k: int = 10) -> List[Tuple[str, float]]:
+    async def _flush_after_interval(self, delay_s: Optional[float] = None):
+        if delay_s is None:
+            delay_s = settings.MILVUS_INSERT_FLUSH_INTERVAL_MS / 1000
+        await asyncio.sleep(delay_s)
+        # Past this point flush() must not cancel us mid-RPC
+        self._flush_timer = None
+        await self._write_buffer()
+    
+    async def _write_buffer(self):
+        """Send everything buffered as one insert"""
+        from app.services.inference_executor import inference_executor
+        
+        async with self._write_lock:
+            if not self._buffer_ids:
+                return
+            
+            data = [self._buffer_ids, self._buffer_embeddings, self._buffer_metadata]
+            self._buffer_ids, self._buffer_embeddings, self._buffer_metadata = [], [], []
+            
+            try:
+                await inference_executor.run_vector_db(self.collection.upsert, data)
+                self._write_failures = 0
+                self.rows_written += len(data[0])
+                self.batches_written += 1
+                logger.info(f"Inserted {len(data[0])} vectors into Milvus")
+                
+            except Exception as e:
+                self.write_errors += 1
+                self._write_failures += 1
+                
+                if self._write_failures > settings.MILVUS_INSERT_MAX_RETRIES:
+                    self.rows_dropped += len(data[0])
+                    self._write_failures = 0
+                    logger.error(
+                        f"Failed to insert into Milvus: {e} - dropping {len(data[0])} rows "
+                        f"after {settings.MILVUS_INSERT_MAX_RETRIES} retries"
+                    )
+                    return
+                
+                # Put the rows back and retry with exponential backoff
+                self._buffer_ids[:0] = data[0]
+                self._buffer_embeddings[:0] = data[1]
+                self._buffer_metadata[:0] = data[2]
+                
+                delay_s = settings.MILVUS_INSERT_FLUSH_INTERVAL_MS / 1000 * 2 ** self._write_failures
+                if self._flush_timer is None or self._flush_timer.done():
+                    self._flush_timer = asyncio.create_task(self._flush_after_interval(delay_s))
+                
+                logger.error(f"Failed to insert into Milvus: {e} (retrying in {delay_s:.1f}s)")
+    
+    async def flush(self):
+        """Write out the buffer now and seal segments (tests, shutdown)"""
+        from app.services.inference_executor import inference_executor
+        
+        if not self.initialized:
+            return
+        
+        try:
+            if self._flush_timer is not None and not self._flush_timer.done():
+                self._flush_timer.cancel()
+            
+            if self._write_tasks:
+                await asyncio.gather(*self._write_tasks)
+            await self._write_buffer()
+            await inference_executor.run_vector_db(self.collection.flush)
+            
+        except Exception as e:
+            logger.error(f"Failed to flush Milvus: {e}")
+    
+    async def count(self) -> int:
+        """Rows in the collection (flushed segments)"""
+        from app.services.inference_executor import inference_executor
+        
+        if not self.initialized:
+            await self.initialize()
+        
+        return await inference_executor.run_vector_db(lambda: self.collection.num_entities)
+    
+    async def import_legacy(self, ids: List[str], batch_size: int = 1000) -> int:
+        """Copy rows for ids out of the pre-rename shared collection"""
+        from app.services.inference_executor import inference_executor
+        
+        try:
+            legacy = await inference_executor.run_vector_db(self._open_legacy_collection)
+            if legacy is None:
+                return 0
+            
+            imported = 0
+            for start in range(0, len(ids), batch_size):
+                chunk = list(ids[start:start + batch_size])
+                rows = await inference_executor.run_vector_db(
+                    legacy.query,
+                    expr=f"id in {json.dumps(chunk)}",
+                    output_fields=["id", "embedding", "metadata"]
+                )
+                if rows:
+                    await self.insert(
+                        ids=[row["id"] for row in rows],
+                        embeddings=np.array([row["embedding"] for row in rows], dtype=np.float32),
+                        metadata=[row.get("metadata") or {} for row in rows]
+                    )
+                    imported += len(rows)
+            
+            logger.info(
+                f"Imported {imported} vectors from Milvus '{self.legacy_collection_name}' "
+                f"into '{self.collection_name}'"
+            )
+            return imported
+            
+        except Exception as e:
+            logger.error(f"Failed to import legacy Milvus vectors: {e}")
+            return 0
+    
+    def _open_legacy_collection(self):
+        from pymilvus import utility, Collection
+        
+        if not utility.has_collection(self.legacy_collection_name, using=self.connection_alias):
+            return None
+        
+        collection = Collection(self.legacy_collection_name, using=self.connection_alias)
+        collection.load()
+        return collection
+    
+    @property
+    def milvus_metric(self) -> str:
+        # The index metric is fixed at collection creation - recreate it after changing VECTOR_METRIC
+        return "IP" if self.metric == "ip" else "L2"
+    
+    def _normalize(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+    
+    async def search(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
         """Search Milvus for similar vectors"""
+        results = await self.search_batch(
+            np.asarray(query_embedding).reshape(1, -1),
+            top_k=top_k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            filters=filters
+        )
+        return results[0] if results else []
+    
+    async def search_batch(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Search many queries in one Milvus request"""
+        from app.services.inference_executor import inference_executor
+        
         try:
             if not self.initialized:
                 await self.initialize()
             
-            # Search parameters
-            search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+            queries = self._normalize(queries)
+            
+            # Search parameters (collection index is IVF_FLAT)
+            search_params = {"metric_type": self.milvus_metric, "params": {"nprobe": nprobe or 10}}
             
-            # Search
-            results = self.collection.search(
-                data=[query_embedding.tolist()],
+            # Search (blocking RPC, overlapped with other requests on the pool)
+            results = await inference_executor.run_vector_db(
+                self.collection.search,
+                data=queries.tolist(),
                 anns_field="embedding",
                 param=search_params,
                 limit=top_k,
+                expr=self._filter_expr(filters),
                 output_fields=["id"]
             )
             
             # Format results
-            output = []
-            for hits in results:
-                for hit in hits:
-                    doc_id = hit.id
-                    distance = hit.distance
-                    score = float(1 / (1 + distance))  # Convert to similarity
-                    output.append((doc_id, score))
-            
-            return output
+            metric = self.milvus_metric.lower()
+            return [
+                [(hit.id, self._to_score(hit.distance, metric)) for hit in hits]
+                for hits in results
+            ]
             
         except Exception as e:
             logger.error(f"Failed to search Milvus: {e}")
-            return []
+            return [[] for _ in range(len(queries))]
+    
+    def get_stats(self) -> Dict:
+        stats = super().get_stats()
+        stats.update({
+            "collection": self.collection_name,
+            "metric": self.milvus_metric,
+            "buffered": len(self._buffer_ids),
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors,
+            "rows_dropped": self.rows_dropped,
+        })
+        return stats
+    
+    def _clean_metadata(self, metadata: Optional[dict]) -> dict:
+        """
+        Milvus expressions can't match JSON null or a missing key, so None
+        and absent filter fields are stored as an empty string
+        """
+        cleaned = {field: "" for field in self.filter_fields}
+        cleaned.update((key, "" if value is None else value) for key, value in (metadata or {}).items())
+        return cleaned
+    
+    @staticmethod
+    def _filter_expr(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Boolean expression over the JSON metadata field"""
+        if not filters:
+            return None
+        
+        clauses = []
+        for field, value in filters.items():
+            if isinstance(value, (list, tuple, set, frozenset)):
+                allowed = ["" if v is None else v for v in value]
+                clauses.append(f'metadata["{field}"] in {json.dumps(allowed)}')
+            else:
+                clauses.append(f'metadata["{field}"] == {json.dumps("" if value is None else value)}')
+        
+        return " and ".join(clauses)
     
     async def delete(self, ids: List[str]):
         """Delete vectors from Milvus"""
+        from app.services.inference_executor import inference_executor
+        
         try:
             if not self.initialized:
                 await self.initialize()
             
+            # Wait out an in-flight write (its rows may include these ids) and
+            # drop still-buffered rows so a later write can't resurrect them
+            async with self._write_lock:
+                deleted = set(ids)
+                keep = [i for i, doc_id in enumerate(self._buffer_ids) if doc_id not in deleted]
+                self._buffer_ids = [self._buffer_ids[i] for i in keep]
+                self._buffer_embeddings = [self._buffer_embeddings[i] for i in keep]
+                self._buffer_metadata = [self._buffer_metadata[i] for i in keep]
+            
             # Delete by IDs
-            expr = f"id in {ids}"
-            self.collection.delete(expr)
+            expr = f"id in {json.dumps(list(ids))}"
+            await inference_executor.run_vector_db(self.collection.delete, expr)
             
             logger.info(f"Deleted {len(ids)} vectors from Milvus")
             
@@ -280,14 +1622,14 @@ class MilvusVectorDB(VectorDB):
 
 
 # Factory function to get the appropriate vector DB
-def get_vector_db() -> VectorDB:
+def get_vector_db(name: str = "default", filter_fields: Tuple[str, ...] = ()) -> VectorDB:
     """Get vector database instance based on config"""
     if settings.VECTOR_DB.lower() == "milvus":
-        return MilvusVectorDB()
+        return MilvusVectorDB(name, filter_fields)
     else:
-        return FAISSVectorDB()
+        return FAISSVectorDB(name, filter_fields)
 
 
 # Global vector DB instances
-global_rag_vector_db = get_vector_db()
-personal_rag_vector_db = get_vector_db()
+global_rag_vector_db = get_vector_db("global", filter_fields=("city", "category"))
+personal_rag_vector_db = get_vector_db("personal", filter_fields=("user_id",))
@@ -1,17 +1,15 @@
 """
 Fraud detection service
 """
-import imagehash
-from PIL import Image
-import io
 import logging
-from typing import Dict
+from typing import Dict, Optional
 import numpy as np
 from datetime import datetime, timedelta
 from bson import ObjectId
 
 from app.services.database import get_fraud_checks_collection, get_pending_items_collection
 from app.models.token_models import FraudCheckModel
+from app.vision.preprocessing import PreparedImage
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +24,16 @@ class FraudService:
         image_bytes: bytes,
         location_lat: float,
         location_lon: float,
-        weight_kg: float
+        weight_kg: float,
+        prepared_image: Optional[PreparedImage] = None
     ) -> Dict:
         """
         Perform comprehensive fraud checks
         
+        Args:
+            prepared_image: Decoded image from the scan's preprocessing stage;
+                image_bytes are only decoded when it is not supplied
+        
         Returns:
             {
                 "is_suspicious": bool,
@@ -40,9 +43,11 @@ class FraudService:
             }
         """
         try:
-            # Compute image hash
-            image = Image.open(io.BytesIO(image_bytes))
-            img_hash = str(imagehash.average_hash(image))
+            # Decode once for hashing and size checks
+            if prepared_image is None:
+                from app.vision.clip_service import vision_service
+                prepared_image = await vision_service.prepare_image(image_bytes)
+            img_hash = prepared_image.average_hash
             
             # Run all fraud checks
             checks = {}
@@ -53,7 +58,7 @@ class FraudService:
             )
             
             # 2. Internet image detection (CLIP similarity to stock images)
-            checks["internet_image"] = await self._check_internet_image(image_bytes)
+            checks["internet_image"] = await self._check_internet_image(prepared_image)
             
             # 3. GPS mismatch check
             checks["gps_mismatch"] = await self._check_gps_mismatch(
@@ -153,15 +158,14 @@ class FraudService:
             logger.error(f"Duplicate check failed: {e}")
             return {"detected": False, "score": 0.0, "message": "Check failed"}
     
-    async def _check_internet_image(self, image_bytes: bytes) -> Dict:
+    async def _check_internet_image(self, prepared_image: PreparedImage) -> Dict:
         """
         Check if image might be from internet (stock photo)
         Using heuristics for now - could use reverse image search
         """
         try:
-            # Simple heuristic: check image quality/size
-            image = Image.open(io.BytesIO(image_bytes))
-            width, height = image.size
+            # Simple heuristic: check image quality/size (as uploaded, not downscaled)
+            width, height = prepared_image.original_size
             
             # Stock photos tend to be high resolution
             is_high_res = width > 2000 and height > 2000
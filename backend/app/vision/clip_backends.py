@@ -0,0 +1,260 @@
+"""
+CLIP inference backends (PyTorch eager / ONNX Runtime int8)
+"""
+import json
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CLIPBackend:
+    """Abstract CLIP tower interface - all inputs/outputs are numpy"""
+    
+    name = "base"
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.logit_scale: Optional[float] = None
+        self.embedding_dim: Optional[int] = None  # projection dim, set by load()
+    
+    def load(self):
+        """Load (or build) the towers - blocking"""
+        raise NotImplementedError
+    
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        """[n, 3, 224, 224] pixels -> [n, dim] L2-normalized embeddings"""
+        raise NotImplementedError
+    
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """[n, seq] token ids -> [n, dim] L2-normalized embeddings"""
+        raise NotImplementedError
+    
+    @property
+    def device(self) -> str:
+        return "cpu"
+
+
+class TorchCLIPBackend(CLIPBackend):
+    """fp32 eager PyTorch CLIPModel"""
+    
+    name = "torch"
+    
+    def __init__(self, model_name: str):
+        super().__init__(model_name)
+        self.model = None
+        self._device = None
+    
+    @property
+    def device(self) -> str:
+        return self._device or "cpu"
+    
+    def load(self):
+        import torch
+        from transformers import CLIPModel
+        
+        self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        
+        model = CLIPModel.from_pretrained(self.model_name)
+        model.to(self._device)
+        model.eval()
+        
+        self.model = model
+        self.logit_scale = model.logit_scale.exp().item()
+        self.embedding_dim = model.config.projection_dim
+    
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        import torch
+        
+        with torch.no_grad():
+            features = self.model.get_image_features(
+                pixel_values=torch.from_numpy(pixel_values).to(self._device)
+            )
+            features = features / features.norm(dim=-1, keepdim=True)
+        
+        return features.cpu().numpy()
+    
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+        
+        with torch.no_grad():
+            features = self.model.get_text_features(
+                input_ids=torch.from_numpy(input_ids).long().to(self._device),
+                attention_mask=torch.from_numpy(attention_mask).long().to(self._device)
+            )
+            features = features / features.norm(dim=-1, keepdim=True)
+        
+        return features.cpu().numpy()
+
+
+class ONNXCLIPBackend(CLIPBackend):
+    """
+    ONNX Runtime CLIP towers with dynamic int8 weight quantization
+    
+    On first use the vision and text towers are exported from the PyTorch
+    checkpoint into CLIP_ONNX_DIR and quantized; later starts only load the
+    .onnx files. Normalization is baked into the exported graphs.
+    """
+    
+    name = "onnx"
+    
+    OPSET = 14
+    
+    def __init__(self, model_name: str, cache_dir: str, quantize: bool = True):
+        super().__init__(model_name)
+        self.model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.quantize = quantize
+        self.vision_session = None
+        self.text_session = None
+    
+    def _path(self, tower: str) -> str:
+        suffix = "int8.onnx" if self.quantize else "fp32.onnx"
+        return os.path.join(self.model_dir, f"{tower}.{suffix}")
+    
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.model_dir, "meta.json")
+    
+    def load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("onnxruntime not installed - required for CLIP_BACKEND=onnx")
+        
+        if not (os.path.exists(self._path("vision"))
+                and os.path.exists(self._path("text"))
+                and os.path.exists(self._meta_path)):
+            self.export()
+        
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        self.logit_scale = float(meta["logit_scale"])
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.CLIP_ONNX_THREADS > 0:
+            options.intra_op_num_threads = settings.CLIP_ONNX_THREADS
+        
+        providers = ["CPUExecutionProvider"]
+        self.vision_session = ort.InferenceSession(self._path("vision"), options, providers=providers)
+        self.text_session = ort.InferenceSession(self._path("text"), options, providers=providers)
+        
+        # Exports before projection_dim was recorded: read the static output width
+        self.embedding_dim = int(meta.get("projection_dim") or self.text_session.get_outputs()[0].shape[-1])
+        
+        logger.info(f"Loaded ONNX CLIP towers from {self.model_dir} (int8={self.quantize})")
+    
+    def export(self):
+        """Export both towers to ONNX and optionally quantize them - blocking"""
+        import torch
+        from transformers import CLIPModel
+        
+        logger.info(f"Exporting {self.model_name} to ONNX in {self.model_dir}")
+        os.makedirs(self.model_dir, exist_ok=True)
+        
+        model = CLIPModel.from_pretrained(self.model_name)
+        model.eval()
+        
+        class VisionTower(torch.nn.Module):
+            def __init__(self, clip):
+                super().__init__()
+                self.clip = clip
+            
+            def forward(self, pixel_values):
+                features = self.clip.get_image_features(pixel_values=pixel_values)
+                return features / features.norm(dim=-1, keepdim=True)
+        
+        class TextTower(torch.nn.Module):
+            def __init__(self, clip):
+                super().__init__()
+                self.clip = clip
+            
+            def forward(self, input_ids, attention_mask):
+                features = self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+                return features / features.norm(dim=-1, keepdim=True)
+        
+        image_size = model.config.vision_config.image_size
+        fp32_vision = os.path.join(self.model_dir, "vision.fp32.onnx")
+        fp32_text = os.path.join(self.model_dir, "text.fp32.onnx")
+        
+        with torch.no_grad():
+            torch.onnx.export(
+                VisionTower(model),
+                (torch.zeros(1, 3, image_size, image_size),),
+                fp32_vision,
+                input_names=["pixel_values"],
+                output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=self.OPSET
+            )
+            torch.onnx.export(
+                TextTower(model),
+                (torch.ones(1, 8, dtype=torch.long), torch.ones(1, 8, dtype=torch.long)),
+                fp32_text,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["text_embeds"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "text_embeds": {0: "batch"}
+                },
+                opset_version=self.OPSET
+            )
+        
+        if self.quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            
+            for tower, fp32_path in (("vision", fp32_vision), ("text", fp32_text)):
+                quantize_dynamic(
+                    fp32_path,
+                    self._path(tower),
+                    op_types_to_quantize=["MatMul", "Attention"],
+                    weight_type=QuantType.QInt8
+                )
+        
+        with open(self._meta_path, "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "logit_scale": model.logit_scale.exp().item(),
+                "projection_dim": model.config.projection_dim,
+                "opset": self.OPSET,
+                "quantized": self.quantize
+            }, f)
+        
+        logger.info(f"ONNX export complete: {self.model_dir}")
+    
+    def image_features(self, pixel_values: np.ndarray) -> np.ndarray:
+        (features,) = self.vision_session.run(
+            None,
+            {"pixel_values": pixel_values.astype(np.float32)}
+        )
+        return features
+    
+    def text_features(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        (features,) = self.text_session.run(
+            None,
+            {
+                "input_ids": input_ids.astype(np.int64),
+                "attention_mask": attention_mask.astype(np.int64)
+            }
+        )
+        return features
+
+
+def get_clip_backend(backend: Optional[str] = None) -> CLIPBackend:
+    """Get CLIP backend instance based on config"""
+    backend = (backend or settings.CLIP_BACKEND).lower()
+    
+    if backend == "onnx":
+        return ONNXCLIPBackend(
+            settings.CLIP_MODEL,
+            cache_dir=settings.CLIP_ONNX_DIR,
+            quantize=settings.CLIP_ONNX_QUANTIZE
+        )
+    
+    return TorchCLIPBackend(settings.CLIP_MODEL)
@@ -1,26 +1,178 @@
 """
 CLIP Vision Service for waste material classification
 """
-import torch
 import numpy as np
-from PIL import Image
-import io
+import hashlib
+import json
+import time
+import asyncio
 import logging
-from typing import List, Dict, Tuple
-from transformers import CLIPProcessor, CLIPModel
+from typing import Any, Callable, List, Dict, Optional, Tuple, Union
+from transformers import CLIPProcessor
 
 from app.config import settings
+from app.vision.clip_backends import CLIPBackend, get_clip_backend
+from app.vision.preprocessing import PreparedImage, prepare_image
+from app.vision.embedding_cache import ImageEmbeddingCache, LRUCache
+from app.vision.label_registry import LabelRegistry, PROMPT_TEMPLATES
+from app.services.inference_executor import inference_executor
 
 logger = logging.getLogger(__name__)
 
 
+class InferenceBatcher:
+    """
+    Micro-batching scheduler for model inference
+    
+    Concurrent callers submit single items; a background worker collects them
+    until max_batch_size items are queued or max_wait_ms has passed since the
+    first one arrived, runs batch_fn once over the whole batch and resolves
+    each caller's future with its own row of the result. batch_fn is blocking
+    and runs on the inference executor.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], Any],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.total_requests = 0
+        self.total_batches = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_batch_time = 0.0
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        
+        if self._worker is None or self._worker.done():
+            self.queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self.queue.put((item, future, time.perf_counter()))
+        return await future
+    
+    async def _run(self):
+        """Collect queued items into batches and dispatch them"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Drain anything that is already waiting without extending the deadline
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            
+            await self._dispatch(batch)
+    
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        """Run one batch and hand each result back to its caller"""
+        started = time.perf_counter()
+        
+        for _, _, enqueued in batch:
+            wait = started - enqueued
+            self.total_queue_wait += wait
+            self.max_queue_wait = max(self.max_queue_wait, wait)
+        
+        self.total_requests += len(batch)
+        self.total_batches += 1
+        self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+        
+        try:
+            results = await inference_executor.run(self.batch_fn, [item for item, _, _ in batch])
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.total_batch_time += time.perf_counter() - started
+        
+        for i, (_, future, _) in enumerate(batch):
+            if not future.done():  # Caller may have been cancelled
+                future.set_result(results[i])
+    
+    def get_stats(self) -> Dict:
+        """Batch-size and queue-wait metrics for throughput tuning"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "avg_batch_size": self.total_requests / self.total_batches if self.total_batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "avg_queue_wait_ms": 1000.0 * self.total_queue_wait / self.total_requests if self.total_requests else 0.0,
+            "max_queue_wait_ms": 1000.0 * self.max_queue_wait,
+            "avg_batch_time_ms": 1000.0 * self.total_batch_time / self.total_batches if self.total_batches else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+        }
+    
+    async def close(self):
+        """Stop the worker and fail anything still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        
+        while self.queue is not None and not self.queue.empty():
+            _, future, _ = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} batcher closed"))
+
+
 class VisionService:
     """CLIP-based vision classification service"""
     
     def __init__(self):
-        self.model = None
+        self.backend: Optional[CLIPBackend] = None  # torch or onnx (CLIP_BACKEND)
         self.processor = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.label_embeddings = {}  # head name -> [num_labels, dim] text embeddings
+        self.label_registry: Optional[LabelRegistry] = None
+        self.logit_scale = None
+        self.image_cache: Optional[ImageEmbeddingCache] = None  # keyed by upload SHA-256
+        self.text_cache = LRUCache(settings.CLIP_TEXT_CACHE_MAX_ENTRIES)  # normalized text -> embedding
+        
+        # Micro-batching of concurrent encode requests
+        self.image_batcher = InferenceBatcher(
+            "clip_image",
+            self._encode_image_batch,
+            max_batch_size=settings.CLIP_MAX_BATCH_SIZE,
+            max_wait_ms=settings.CLIP_MAX_BATCH_WAIT_MS
+        )
+        self.text_batcher = InferenceBatcher(
+            "clip_text",
+            self._encode_text_batch,
+            max_batch_size=settings.CLIP_MAX_BATCH_SIZE,
+            max_wait_ms=settings.CLIP_MAX_BATCH_WAIT_MS
+        )
         
         # Material categories for zero-shot classification
         self.material_labels = [
@@ -93,40 +245,88 @@ class VisionService:
     async def initialize(self):
         """Load CLIP model"""
         try:
-            logger.info(f"Loading CLIP model: {settings.CLIP_MODEL}")
+            logger.info(f"Loading CLIP model: {settings.CLIP_MODEL} (backend={settings.CLIP_BACKEND})")
+            
+            await inference_executor.run(self._load_model)
             
-            self.model = CLIPModel.from_pretrained(settings.CLIP_MODEL)
-            self.processor = CLIPProcessor.from_pretrained(settings.CLIP_MODEL)
+            # Embeddings from a previous model/backend are stale
+            self.text_cache.clear()
             
-            self.model.to(self.device)
-            self.model.eval()
+            if settings.CLIP_CACHE_ENABLED:
+                self._open_image_cache()
             
-            logger.info(f"CLIP model loaded on {self.device}")
+            logger.info(f"CLIP model loaded: {self.backend.name} on {self.backend.device}")
             
         except Exception as e:
             logger.error(f"Failed to load CLIP model: {e}")
             raise
     
-    async def encode_image(self, image_bytes: bytes) -> np.ndarray:
+    def _load_model(self, backend_name: Optional[str] = None):
+        """Blocking model load (runs on the inference executor)"""
+        backend = get_clip_backend(backend_name)
+        backend.load()
+        
+        self.processor = CLIPProcessor.from_pretrained(settings.CLIP_MODEL)
+        self.backend = backend
+        
+        # Precompute label text embeddings once so scans only run the image tower
+        self._build_label_embeddings()
+    
+    def _open_image_cache(self):
+        """Open the image cache scoped to the current model, backend and label sets"""
+        if self.image_cache is not None:
+            self.image_cache.close()
+        
+        labels_digest = hashlib.sha1(
+            json.dumps([self.label_registry.templates, self._label_sets()], sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+        namespace = f"{settings.CLIP_MODEL}|{self.backend.name}|{labels_digest}"
+        
+        self.image_cache = ImageEmbeddingCache(
+            namespace,
+            max_entries=settings.CLIP_CACHE_MAX_ENTRIES,
+            disk_path=settings.CLIP_CACHE_DISK_PATH
+        )
+    
+    def _cache_key(self, image: Union[bytes, PreparedImage]) -> Optional[str]:
+        if self.image_cache is None:
+            return None
+        if isinstance(image, PreparedImage):
+            return image.content_key
+        return ImageEmbeddingCache.content_key(image)
+    
+    async def prepare_image(self, image_bytes: bytes) -> PreparedImage:
+        """
+        Decode an upload once: EXIF-oriented, draft-downscaled image, CLIP
+        pixel tensor and average hash, reusable by hashing and fraud checks
+        """
+        if self.backend is None:
+            await self.initialize()
+        
+        return await inference_executor.run(
+            prepare_image, image_bytes, self.processor, settings.IMAGE_HASH_FULL_DECODE
+        )
+    
+    async def encode_image(self, image: Union[bytes, PreparedImage]) -> np.ndarray:
         """Encode image to embedding vector"""
         try:
-            if self.model is None:
+            if self.backend is None:
                 await self.initialize()
             
-            # Load image
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            # Repeated upload - skip CLIP
+            cache_key = self._cache_key(image)
+            if cache_key:
+                cached = self.image_cache.get(cache_key)
+                if cached is not None:
+                    return cached[1]
             
-            # Process image
-            inputs = self.processor(images=image, return_tensors="pt")
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            # Load image
+            prepared = await self._ensure_prepared(image)
             
-            # Get image embedding
-            with torch.no_grad():
-                image_features = self.model.get_image_features(**inputs)
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            embedding = await self._embed_image(prepared.pixel_values)
             
-            # Convert to numpy
-            embedding = image_features.cpu().numpy()[0]
+            if cache_key:
+                self.image_cache.put(cache_key, embedding)
             
             return embedding
             
@@ -135,123 +335,362 @@ class VisionService:
             raise
     
     async def encode_text(self, text: str) -> np.ndarray:
-        """Encode text to embedding vector"""
+        """Encode text to embedding vector (LRU-cached on normalized text)"""
         try:
-            if self.model is None:
+            if self.backend is None:
                 await self.initialize()
             
-            # Process text with truncation to respect CLIP's 77 token limit
-            inputs = self.processor(
-                text=[text], 
-                return_tensors="pt", 
-                padding=True,
-                truncation=True,
-                max_length=77
-            )
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Get text embedding
-            with torch.no_grad():
-                text_features = self.model.get_text_features(**inputs)
-                text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+            key = self._normalize_text(text)
+            cached = self.text_cache.get(key)
+            if cached is not None:
+                return cached.copy()
             
-            # Convert to numpy
-            embedding = text_features.cpu().numpy()[0]
+            if settings.CLIP_BATCHING_ENABLED:
+                embedding = await self.text_batcher.submit(key)
+            else:
+                embeddings = await inference_executor.run(self._encode_text_batch, [key])
+                embedding = embeddings[0]
             
-            return embedding
+            self.text_cache.put(key, embedding)
+            return embedding.copy()
             
         except Exception as e:
             logger.error(f"Failed to encode text: {e}")
             raise
     
+    async def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many texts at once
+        
+        Cache misses are deduplicated and tokenized/encoded together in chunks
+        of CLIP_TEXT_BULK_BATCH_SIZE, one forward pass per chunk.
+        
+        Returns:
+            [len(texts), dim] normalized embeddings in input order
+        """
+        try:
+            if self.backend is None:
+                await self.initialize()
+            
+            keys = [self._normalize_text(text) for text in texts]
+            
+            found = {}
+            missing = []
+            for key in dict.fromkeys(keys):  # unique, order kept
+                cached = self.text_cache.get(key)
+                if cached is not None:
+                    found[key] = cached
+                else:
+                    missing.append(key)
+            
+            chunk_size = max(1, settings.CLIP_TEXT_BULK_BATCH_SIZE)
+            for start in range(0, len(missing), chunk_size):
+                chunk = missing[start:start + chunk_size]
+                embeddings = await inference_executor.run(self._encode_text_batch, chunk)
+                for key, embedding in zip(chunk, embeddings):
+                    self.text_cache.put(key, embedding)
+                    found[key] = embedding
+            
+            if not keys:
+                return np.zeros((0, self.backend.embedding_dim), dtype=np.float32)
+            
+            return np.stack([found[key] for key in keys])
+            
+        except Exception as e:
+            logger.error(f"Failed to encode texts: {e}")
+            raise
+    
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Cache key for a query - CLIP's tokenizer lowercases and collapses whitespace anyway"""
+        return " ".join(text.lower().split())
+    
+    async def _ensure_prepared(self, image: Union[bytes, PreparedImage]) -> PreparedImage:
+        """Accept raw bytes or an already prepared image"""
+        if isinstance(image, PreparedImage):
+            if image.pixel_values is None:
+                raise ValueError("PreparedImage has no pixel_values - use vision_service.prepare_image")
+            return image
+        
+        return await self.prepare_image(image)
+    
+    async def _embed_image(self, pixel_values: np.ndarray) -> np.ndarray:
+        """Route one preprocessed image through the batcher (or encode it directly)"""
+        if settings.CLIP_BATCHING_ENABLED:
+            return await self.image_batcher.submit(pixel_values)
+        
+        embeddings = await inference_executor.run(self._encode_image_batch, [pixel_values])
+        return embeddings[0]
+    
+    def _encode_image_batch(self, pixel_values: List[np.ndarray]) -> np.ndarray:
+        """Encode a batch of [3, 224, 224] pixel tensors in one forward pass -> [n, dim] normalized"""
+        return self.backend.image_features(np.stack(pixel_values))
+    
+    def _encode_text_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch of texts in one forward pass -> [n, dim] normalized"""
+        # Process text with truncation to respect CLIP's 77 token limit
+        inputs = self.processor(
+            text=texts, 
+            return_tensors="np", 
+            padding=True,
+            truncation=True,
+            max_length=77
+        )
+        
+        # Get text embedding
+        return self.backend.text_features(inputs["input_ids"], inputs["attention_mask"])
+    
+    def get_stats(self) -> Dict:
+        """Inference batching and cache metrics"""
+        return {
+            "backend": settings.CLIP_BACKEND,
+            "batching_enabled": settings.CLIP_BATCHING_ENABLED,
+            "image_batcher": self.image_batcher.get_stats(),
+            "text_batcher": self.text_batcher.get_stats(),
+            "image_cache": self.image_cache.get_stats() if self.image_cache else None,
+            "text_cache": self.text_cache.get_stats(),
+            "label_registry": self.label_registry.get_stats() if self.label_registry else None,
+        }
+    
+    async def shutdown(self):
+        """Stop batching workers and close caches"""
+        await self.image_batcher.close()
+        await self.text_batcher.close()
+        
+        if self.image_cache is not None:
+            self.image_cache.close()
+    
     async def zero_shot_classification(
         self, 
-        image_bytes: bytes
+        image: Union[bytes, PreparedImage]
     ) -> Dict:
         """
         Perform zero-shot classification for material, hazard, and cleanliness
         """
+        prediction, _ = await self.classify_and_encode(image)
+        return prediction
+    
+    async def classify_and_encode(
+        self,
+        image: Union[bytes, PreparedImage]
+    ) -> Tuple[Dict, np.ndarray]:
+        """
+        Classify material, hazard and cleanliness from a single image forward pass
+        
+        The image is encoded once and scored against the precomputed label
+        embeddings of every head. The same embedding is returned as v_img.
+        
+        Returns:
+            (prediction, image_embedding)
+        """
         try:
-            if self.model is None:
+            if self.backend is None:
                 await self.initialize()
             
-            # Load image
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            # Repeated upload - reuse the stored embedding / prediction
+            cache_key = self._cache_key(image)
+            cached = self.image_cache.get(cache_key) if cache_key else None
             
-            # 1. Material Classification
-            material_result = await self._classify(image, self.material_labels)
+            if cached is not None and cached[0] is not None:
+                return cached
             
-            # 2. Hazard Detection
-            hazard_result = await self._classify(image, self.hazard_labels)
+            if cached is not None:
+                embedding = cached[1]
+            else:
+                # Load image (decoded once per scan)
+                prepared = await self._ensure_prepared(image)
+                
+                # Encode image once (batched with concurrent scans)
+                embedding = await self._embed_image(prepared.pixel_values)
             
-            # 3. Cleanliness Assessment
-            cleanliness_result = await self._classify(image, self.cleanliness_labels)
+            prediction = await inference_executor.run(self._predict_from_embedding, embedding)
             
-            # Process results
-            material = material_result["label"]
-            material_confidence = material_result["confidence"]
+            if cache_key:
+                self.image_cache.put(cache_key, embedding, prediction)
             
-            # Get top 3 predictions for richer context
-            top_predictions = material_result["all_scores"][:3]
+            return prediction, embedding
             
-            # Map to standard material names
-            material_mapped = self._map_material(material)
+        except Exception as e:
+            logger.error(f"Failed to classify image: {e}")
+            raise
+    
+    async def classify_and_encode_many(
+        self,
+        images: List[Union[bytes, PreparedImage]]
+    ) -> List[Tuple[Dict, np.ndarray]]:
+        """
+        Batch variant of classify_and_encode for multi-item uploads
+        
+        Cache misses are encoded together (CLIP_MAX_BATCH_SIZE per forward
+        pass) and all heads are scored in one executor call.
+        
+        Returns:
+            [(prediction, image_embedding), ...] in input order
+        """
+        try:
+            if self.backend is None:
+                await self.initialize()
             
-            # Create detailed description based on what CLIP sees
-            detailed_description = self._create_detailed_description(
-                top_predictions,
-                hazard_result,
-                cleanliness_result
+            keys = [self._cache_key(image) for image in images]
+            results: List[Optional[Tuple[Dict, np.ndarray]]] = [None] * len(images)
+            embeddings: List[Optional[np.ndarray]] = [None] * len(images)
+            to_encode = []
+            
+            for i, key in enumerate(keys):
+                cached = self.image_cache.get(key) if key else None
+                if cached is not None and cached[0] is not None:
+                    results[i] = cached
+                elif cached is not None:
+                    embeddings[i] = cached[1]
+                else:
+                    to_encode.append(i)
+            
+            if to_encode:
+                prepared = await asyncio.gather(*[self._ensure_prepared(images[i]) for i in to_encode])
+                
+                chunk_size = max(1, settings.CLIP_MAX_BATCH_SIZE)
+                for start in range(0, len(to_encode), chunk_size):
+                    chunk = prepared[start:start + chunk_size]
+                    encoded = await inference_executor.run(
+                        self._encode_image_batch,
+                        [p.pixel_values for p in chunk]
+                    )
+                    for i, embedding in zip(to_encode[start:start + chunk_size], encoded):
+                        embeddings[i] = embedding
+            
+            pending = [i for i in range(len(images)) if results[i] is None]
+            predictions = await inference_executor.run(
+                lambda: [self._predict_from_embedding(embeddings[i]) for i in pending]
             )
             
-            # Hazard class (if not "no hazard" or "safe")
-            hazard_class = None
-            hazard_label = hazard_result["label"].lower()
-            if ("safe" not in hazard_label and "no hazard" not in hazard_label 
-                and hazard_result["confidence"] > 0.5):  # Higher threshold to reduce false positives
-                hazard_class = hazard_result["label"]
+            for i, prediction in zip(pending, predictions):
+                results[i] = (prediction, embeddings[i])
+                if keys[i]:
+                    self.image_cache.put(keys[i], embeddings[i], prediction)
             
-            # Cleanliness score (0-100)
-            cleanliness_score = self._compute_cleanliness_score(cleanliness_result)
-            
-            return {
-                "material": material_mapped,
-                "confidence": material_confidence,
-                "detailed_description": detailed_description,  # NEW: Rich context for RAG
-                "raw_detection": material,  # What CLIP actually detected
-                "all_predictions": material_result["all_scores"],
-                "cleanliness_score": cleanliness_score,
-                "hazard_class": hazard_class,
-            }
+            return results
             
         except Exception as e:
-            logger.error(f"Failed to classify image: {e}")
+            logger.error(f"Failed to classify image batch: {e}")
             raise
     
-    async def _classify(
+    def _predict_from_embedding(self, embedding: np.ndarray) -> Dict:
+        """Score one normalized image embedding against every zero-shot head"""
+        image_features = embedding.reshape(1, -1)
+        
+        # 1. Material Classification
+        material_result = self._classify(image_features, "material")
+        
+        # 2. Hazard Detection
+        hazard_result = self._classify(image_features, "hazard")
+        
+        # 3. Cleanliness Assessment
+        cleanliness_result = self._classify(image_features, "cleanliness")
+        
+        return self._build_prediction(material_result, hazard_result, cleanliness_result)
+    
+    def _build_prediction(
+        self,
+        material_result: Dict,
+        hazard_result: Dict,
+        cleanliness_result: Dict
+    ) -> Dict:
+        """Combine per-head results into the scan prediction"""
+        # Process results
+        material = material_result["label"]
+        material_confidence = material_result["confidence"]
+        
+        # Get top 3 predictions for richer context
+        top_predictions = material_result["all_scores"][:3]
+        
+        # Map to standard material names
+        material_mapped = self._map_material(material)
+        
+        # Create detailed description based on what CLIP sees
+        detailed_description = self._create_detailed_description(
+            top_predictions,
+            hazard_result,
+            cleanliness_result
+        )
+        
+        # Hazard class (if not "no hazard" or "safe")
+        hazard_class = None
+        hazard_label = hazard_result["label"].lower()
+        if ("safe" not in hazard_label and "no hazard" not in hazard_label 
+            and hazard_result["confidence"] > 0.5):  # Higher threshold to reduce false positives
+            hazard_class = hazard_result["label"]
+        
+        # Cleanliness score (0-100)
+        cleanliness_score = self._compute_cleanliness_score(cleanliness_result)
+        
+        return {
+            "material": material_mapped,
+            "confidence": material_confidence,
+            "detailed_description": detailed_description,  # NEW: Rich context for RAG
+            "raw_detection": material,  # What CLIP actually detected
+            "all_predictions": material_result["all_scores"],
+            "cleanliness_score": cleanliness_score,
+            "hazard_class": hazard_class,
+        }
+    
+    def _label_sets(self) -> Dict[str, List[str]]:
+        """Zero-shot heads and their label lists"""
+        return {
+            "material": self.material_labels,
+            "hazard": self.hazard_labels,
+            "cleanliness": self.cleanliness_labels,
+        }
+    
+    def _build_label_embeddings(self):
+        """Load (or encode and persist) prompt-ensembled embeddings for every zero-shot head"""
+        templates = PROMPT_TEMPLATES if settings.CLIP_PROMPT_ENSEMBLE else ["{}"]
+        self.label_registry = LabelRegistry(
+            settings.CLIP_LABEL_CACHE_DIR,
+            model_key=f"{settings.CLIP_MODEL}__{self.backend.name}",
+            templates=templates
+        )
+        
+        label_embeddings = {}
+        for head, labels in self._label_sets().items():
+            label_embeddings[head] = self.label_registry.load_head(head, labels, self._encode_prompts)
+        
+        self.label_embeddings = label_embeddings
+        
+        # Same temperature CLIPModel applies to logits_per_image
+        self.logit_scale = self.backend.logit_scale
+        
+        logger.info(
+            "Label embeddings ready: "
+            + ", ".join(f"{head}={len(labels)}" for head, labels in self._label_sets().items())
+            + f" ({self.label_registry.get_stats()})"
+        )
+    
+    def _encode_prompts(self, prompts: List[str]) -> np.ndarray:
+        """Blocking chunked text encoding for the label registry"""
+        chunk_size = max(1, settings.CLIP_TEXT_BULK_BATCH_SIZE)
+        return np.concatenate([
+            self._encode_text_batch(prompts[start:start + chunk_size])
+            for start in range(0, len(prompts), chunk_size)
+        ])
+    
+    def _classify(
         self, 
-        image: Image.Image, 
-        labels: List[str]
+        image_features: np.ndarray, 
+        head: str
     ) -> Dict:
-        """Internal classification method"""
+        """Score a normalized image embedding against one head's label embeddings"""
         try:
-            # Process inputs
-            inputs = self.processor(
-                text=labels,
-                images=image,
-                return_tensors="pt",
-                padding=True
-            )
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            labels = self._label_sets()[head]
+            text_features = self.label_embeddings[head]
             
-            # Get predictions
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits_per_image = outputs.logits_per_image
-                probs = logits_per_image.softmax(dim=1)
+            # Get predictions (softmax over logits_per_image)
+            logits_per_image = self.logit_scale * image_features @ text_features.T
+            logits_per_image = logits_per_image - logits_per_image.max(axis=1, keepdims=True)
+            probs = np.exp(logits_per_image)
+            probs = probs / probs.sum(axis=1, keepdims=True)
             
             # Get results
-            probs_np = probs.cpu().numpy()[0]
+            probs_np = probs[0]
             top_idx = probs_np.argmax()
             
             # All scores
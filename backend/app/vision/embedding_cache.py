@@ -0,0 +1,187 @@
+"""
+Caches for CLIP embeddings and zero-shot predictions
+"""
+import copy
+import hashlib
+import logging
+import os
+import shelve
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Size-bounded in-memory LRU with hit/miss counters"""
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(0, max_entries)
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries == 0:
+            return
+        
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ImageEmbeddingCache:
+    """
+    Content-addressed cache of image embeddings and zero-shot predictions
+    
+    Keys are SHA-256 digests of the uploaded bytes, so retried uploads and
+    rescans of the same photo skip CLIP entirely. Entries live in a memory LRU
+    with an optional on-disk shelf behind it. Everything is scoped to a
+    namespace (model, backend, label sets); opening a shelf written under a
+    different namespace discards it.
+    """
+    
+    NAMESPACE_KEY = "__namespace__"
+    
+    def __init__(self, namespace: str, max_entries: int = 2048, disk_path: Optional[str] = None):
+        self.namespace = namespace
+        self.memory = LRUCache(max_entries)
+        self.disk_path = disk_path or None
+        self.shelf = None
+        
+        self.disk_hits = 0
+        self.disk_errors = 0
+        
+        if self.disk_path:
+            self._open_shelf()
+    
+    @staticmethod
+    def content_key(image_bytes: bytes) -> str:
+        """Content address of an upload"""
+        return hashlib.sha256(image_bytes).hexdigest()
+    
+    def _open_shelf(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            self.shelf = shelve.open(self.disk_path)
+            
+            if self.shelf.get(self.NAMESPACE_KEY) != self.namespace:
+                # Model or labels changed - entries are stale
+                self.shelf.close()
+                self.shelf = shelve.open(self.disk_path, flag="n")
+                self.shelf[self.NAMESPACE_KEY] = self.namespace
+                logger.info(f"Reset image embedding cache at {self.disk_path} for {self.namespace}")
+                
+        except Exception as e:
+            logger.warning(f"Image embedding disk cache unavailable ({self.disk_path}): {e}")
+            self.shelf = None
+    
+    def get(self, key: str) -> Optional[Tuple[Optional[Dict], np.ndarray]]:
+        """
+        Look up an upload
+        
+        Returns:
+            (prediction or None, embedding) copies, or None on miss
+        """
+        entry = self.memory.get(key)
+        
+        if entry is None and self.shelf is not None:
+            try:
+                stored = self.shelf.get(key)
+            except Exception as e:
+                self.disk_errors += 1
+                logger.warning(f"Image embedding disk cache read failed: {e}")
+                stored = None
+            
+            if stored is not None:
+                self.disk_hits += 1
+                entry = (
+                    stored["prediction"],
+                    np.frombuffer(stored["embedding"], dtype=np.float32).copy()
+                )
+                self.memory.put(key, entry)
+        
+        if entry is None:
+            return None
+        
+        prediction, embedding = entry
+        return copy.deepcopy(prediction), embedding.copy()
+    
+    def put(self, key: str, embedding: np.ndarray, prediction: Optional[Dict] = None):
+        """Store an embedding (and prediction if computed)"""
+        if prediction is None:
+            # Keep a prediction an earlier classify call already stored
+            existing = self.memory.entries.get(key)
+            if existing is not None:
+                prediction = existing[0]
+        
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.memory.put(key, (copy.deepcopy(prediction), embedding.copy()))
+        
+        if self.shelf is not None:
+            try:
+                self.shelf[key] = {"prediction": prediction, "embedding": embedding.tobytes()}
+            except Exception as e:
+                self.disk_errors += 1
+                logger.warning(f"Image embedding disk cache write failed: {e}")
+    
+    def clear(self):
+        self.memory.clear()
+        if self.shelf is not None:
+            self.shelf.clear()
+            self.shelf[self.NAMESPACE_KEY] = self.namespace
+    
+    def close(self):
+        if self.shelf is not None:
+            self.shelf.close()
+            self.shelf = None
+    
+    def get_stats(self) -> Dict:
+        stats = self.memory.get_stats()
+        
+        # A disk hit was first counted as a memory miss
+        hits = self.memory.hits + self.disk_hits
+        misses = self.memory.misses - self.disk_hits
+        
+        stats.update({
+            "namespace": self.namespace,
+            "disk_enabled": self.shelf is not None,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "total_hits": hits,
+            "total_misses": misses,
+            "total_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        })
+        return stats
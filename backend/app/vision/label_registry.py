@@ -0,0 +1,136 @@
+"""
+Precomputed label embeddings for the zero-shot heads
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Prompt ensemble - each label is embedded as the mean of these prompts
+PROMPT_TEMPLATES = [
+    "{}",
+    "a photo of {}.",
+    "a close-up photo of {}.",
+    "a photo of {} in a trash bin.",
+]
+
+
+class LabelRegistry:
+    """
+    Prompt-ensembled text embeddings for each zero-shot label set
+    
+    Embeddings are persisted as .npy files under
+    <cache_dir>/<model_key>/: one file per label (keyed by a hash of the label
+    and the prompt templates) plus one stacked matrix per head keyed by a hash
+    of the whole label list. A warm start loads the head matrix without
+    touching the text tower; adding one label only encodes that label.
+    """
+    
+    def __init__(self, cache_dir: str, model_key: str, templates: List[str] = None):
+        self.templates = list(templates or PROMPT_TEMPLATES)
+        self.model_dir = os.path.join(cache_dir, model_key.replace("/", "__"))
+        self.label_dir = os.path.join(self.model_dir, "labels")
+        
+        # Metrics
+        self.heads_loaded = 0
+        self.labels_loaded = 0
+        self.labels_computed = 0
+    
+    def _digest(self, *parts) -> str:
+        payload = json.dumps([self.templates, *parts], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+    
+    def head_path(self, head: str, labels: List[str]) -> str:
+        return os.path.join(self.model_dir, f"{head}-{self._digest(labels)}.npy")
+    
+    def label_path(self, label: str) -> str:
+        return os.path.join(self.label_dir, f"{self._digest(label)}.npy")
+    
+    def load_head(
+        self,
+        head: str,
+        labels: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Get [len(labels), dim] normalized embeddings for one head - blocking
+        
+        Args:
+            encode_fn: Encodes a list of prompts -> [n, dim] normalized embeddings
+        """
+        path = self.head_path(head, labels)
+        
+        if os.path.exists(path):
+            try:
+                embeddings = np.load(path)
+                if embeddings.shape[0] == len(labels):
+                    self.heads_loaded += 1
+                    return embeddings
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable label embeddings {path}: {e}")
+        
+        embeddings = [None] * len(labels)
+        missing = []
+        
+        for i, label in enumerate(labels):
+            label_path = self.label_path(label)
+            if os.path.exists(label_path):
+                try:
+                    embeddings[i] = np.load(label_path)
+                    self.labels_loaded += 1
+                    continue
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable label embedding {label_path}: {e}")
+            missing.append(i)
+        
+        if missing:
+            computed = self._encode_labels([labels[i] for i in missing], encode_fn)
+            os.makedirs(self.label_dir, exist_ok=True)
+            
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                self._save(self.label_path(labels[i]), embedding)
+            
+            self.labels_computed += len(missing)
+            logger.info(f"Encoded {len(missing)} new label(s) for head '{head}'")
+        
+        stacked = np.stack(embeddings).astype(np.float32)
+        self._save(path, stacked)
+        return stacked
+    
+    def _encode_labels(
+        self,
+        labels: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """Mean of the prompt embeddings per label, re-normalized"""
+        prompts = [template.format(label) for label in labels for template in self.templates]
+        prompt_embeddings = encode_fn(prompts).reshape(len(labels), len(self.templates), -1)
+        
+        embeddings = prompt_embeddings.mean(axis=1)
+        embeddings /= np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings.astype(np.float32)
+    
+    def _save(self, path: str, array: np.ndarray):
+        """Atomic write so concurrent workers never read a partial file"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not persist label embeddings to {path}: {e}")
+    
+    def get_stats(self) -> Dict:
+        return {
+            "templates": len(self.templates),
+            "heads_loaded": self.heads_loaded,
+            "labels_loaded": self.labels_loaded,
+            "labels_computed": self.labels_computed,
+        }
@@ -0,0 +1,140 @@
+"""
+Decode-once image preprocessing for scans
+"""
+import hashlib
+import io
+import logging
+from typing import Optional, Tuple
+
+import imagehash
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Smallest side kept after draft/reduce - comfortably above CLIP's 224px crop
+DECODE_MIN_SIDE = 448
+
+
+class PreparedImage:
+    """
+    One decoded upload, shared by vision, hashing and fraud checks
+    
+    Attributes:
+        image: RGB image, EXIF-oriented and downscaled for inference
+        original_size: (width, height) of the upload after orientation
+        format: Source format reported by PIL (JPEG, PNG, ...)
+        average_hash: imagehash.average_hash string (see prepare_image)
+        pixel_values: [3, 224, 224] CLIP input tensor (None if no processor)
+        num_bytes: Size of the uploaded file
+        content_key: SHA-256 of the uploaded bytes (embedding cache key)
+    """
+    
+    __slots__ = (
+        "image", "original_size", "format", "average_hash",
+        "pixel_values", "num_bytes", "content_key"
+    )
+    
+    def __init__(
+        self,
+        image: Image.Image,
+        original_size: Tuple[int, int],
+        format: Optional[str],
+        average_hash: str,
+        pixel_values: Optional[np.ndarray],
+        num_bytes: int,
+        content_key: Optional[str] = None
+    ):
+        self.image = image
+        self.original_size = original_size
+        self.format = format
+        self.average_hash = average_hash
+        self.pixel_values = pixel_values
+        self.num_bytes = num_bytes
+        self.content_key = content_key
+    
+    @property
+    def width(self) -> int:
+        return self.original_size[0]
+    
+    @property
+    def height(self) -> int:
+        return self.original_size[1]
+
+
+def decode_image(
+    image_bytes: bytes,
+    min_side: int = DECODE_MIN_SIDE
+) -> Tuple[Image.Image, Tuple[int, int], Optional[str]]:
+    """
+    Decode upload bytes to a small RGB image
+    
+    JPEGs are decoded with draft mode so libjpeg scales by 1/2, 1/4 or 1/8
+    while decoding instead of materializing the full 12MP frame. Other formats
+    are reduced after decoding. EXIF orientation is applied afterwards.
+    
+    Returns:
+        (image, original_size, format)
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    source_format = image.format
+    width, height = image.size
+    
+    # EXIF orientations 5-8 swap width and height
+    orientation = image.getexif().get(0x0112, 1)
+    original_size = (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+    
+    if source_format == "JPEG":
+        scale = max(1, min(width, height) // min_side)
+        if scale > 1:
+            image.draft("RGB", (width // scale, height // scale))
+    else:
+        factor = min(width, height) // min_side
+        if factor > 1:
+            image = image.reduce(factor)
+    
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGB")
+    
+    return image, original_size, source_format
+
+
+def legacy_average_hash(image_bytes: bytes) -> str:
+    """
+    average_hash of the full-size upload as stored, without EXIF rotation -
+    the basis of every image_hash already in pending_items
+    """
+    return str(imagehash.average_hash(Image.open(io.BytesIO(image_bytes))))
+
+
+def prepare_image(image_bytes: bytes, processor=None, full_decode_hash: bool = True) -> PreparedImage:
+    """
+    Decode once and derive everything a scan needs - blocking
+    
+    Args:
+        image_bytes: Uploaded file
+        processor: CLIPProcessor used to build pixel_values (optional)
+        full_decode_hash: Hash the full-size upload (legacy_average_hash) so
+            duplicate checks match stored hashes; False hashes the oriented,
+            draft-decoded image instead, skipping the second decode
+    """
+    image, original_size, source_format = decode_image(image_bytes)
+    
+    if full_decode_hash:
+        average_hash = legacy_average_hash(image_bytes)
+    else:
+        average_hash = str(imagehash.average_hash(image))
+    
+    pixel_values = None
+    if processor is not None:
+        pixel_values = processor(images=image, return_tensors="np")["pixel_values"][0]
+    
+    return PreparedImage(
+        image=image,
+        original_size=original_size,
+        format=source_format,
+        average_hash=average_hash,
+        pixel_values=pixel_values,
+        num_bytes=len(image_bytes),
+        content_key=hashlib.sha256(image_bytes).hexdigest()
+    )
@@ -9,6 +9,7 @@ from pydub import AudioSegment
 from typing import Optional
 
 from app.config import settings
+from app.services.inference_executor import inference_executor
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ class VoiceService:
         try:
             logger.info(f"Loading Whisper model: {self.model_name}")
             
-            self.model = whisper.load_model(self.model_name)
+            self.model = await inference_executor.run_audio(whisper.load_model, self.model_name)
             
             logger.info(f"Whisper model loaded: {self.model_name}")
             
@@ -56,43 +57,57 @@ class VoiceService:
             if self.model is None:
                 await self.initialize()
             
-            # Convert audio to format Whisper expects
-            audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
-            
-            # Convert to mono and 16kHz if needed
-            audio = audio.set_channels(1).set_frame_rate(16000)
-            
-            # Export to WAV
-            wav_io = io.BytesIO()
-            audio.export(wav_io, format="wav")
-            wav_io.seek(0)
-            
-            # Save temporarily (Whisper needs file path)
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(wav_io.read())
-                temp_path = temp_file.name
+            # Decode + transcribe off the event loop
+            return await inference_executor.run_audio(
+                self._transcribe_sync,
+                audio_bytes,
+                language
+            )
             
-            # Transcribe
+        except Exception as e:
+            logger.error(f"Failed to transcribe audio: {e}")
+            raise
+    
+    def _transcribe_sync(
+        self,
+        audio_bytes: bytes,
+        language: Optional[str] = None
+    ) -> dict:
+        """Blocking decode + Whisper transcription (runs on the audio executor)"""
+        # Convert audio to format Whisper expects
+        audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+        
+        # Convert to mono and 16kHz if needed
+        audio = audio.set_channels(1).set_frame_rate(16000)
+        
+        # Export to WAV
+        wav_io = io.BytesIO()
+        audio.export(wav_io, format="wav")
+        wav_io.seek(0)
+        
+        # Save temporarily (Whisper needs file path)
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+            temp_file.write(wav_io.read())
+            temp_path = temp_file.name
+        
+        # Transcribe
+        import os
+        try:
             result = self.model.transcribe(
                 temp_path,
                 language=language,
                 fp16=False
             )
-            
+        finally:
             # Clean up temp file
-            import os
             os.unlink(temp_path)
-            
-            return {
-                "text": result["text"].strip(),
-                "language": result.get("language", language or "en"),
-                "confidence": self._compute_confidence(result)
-            }
-            
-        except Exception as e:
-            logger.error(f"Failed to transcribe audio: {e}")
-            raise
+        
+        return {
+            "text": result["text"].strip(),
+            "language": result.get("language", language or "en"),
+            "confidence": self._compute_confidence(result)
+        }
     
     def _compute_confidence(self, whisper_result: dict) -> float:
         """Compute average confidence from Whisper segments"""
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Scan pipeline benchmark
+Runs /api/scan/scan_image end to end on synthetic images with local
+stand-ins for Groq, Nominatim, Overpass, OSRM and Bhashini, and reports
+per-stage p50/p95/p99 latency plus throughput at several concurrency levels.
+
+CLIP, fusion, FAISS retrieval, recycler ranking and MongoDB run for real.
+MongoDB is mongomock-motor unless --mongo-url points at a local server.
+
+Usage:
+    python benchmarks/bench_scan_pipeline.py [--requests 64] [--concurrency 1,4,16]
+        [--mongo-url mongodb://localhost:27017] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from bson import ObjectId
+from fastapi import UploadFile
+
+from app.config import settings
+from app.rag.embedding_codec import encode_embedding
+from app.services.database import db
+from benchmarks.stubs import BENCH_LAT, BENCH_LON, install_stubs, synthetic_images
+
+STAGES = ["vision", "osm", "fusion", "rag", "marketplace", "llm", "translation", "db_reads", "db_writes"]
+
+DB_READS = {"find_one", "count_documents"}
+DB_WRITES = {"insert_one", "insert_many", "update_one", "update_many", "delete_one", "delete_many"}
+
+# Per-request stage totals; gather() children share the parent's dict
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("timings", default=None)
+
+
+def _record(stage: str, elapsed: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage: str, fn):
+    """Wrap an async callable so its wall time is charged to a stage"""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _record(stage, time.perf_counter() - start)
+    return wrapper
+
+
+class TimedCollection:
+    """Collection proxy charging awaited reads/writes to db_reads/db_writes"""
+    
+    def __init__(self, collection):
+        self._collection = collection
+    
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in DB_WRITES:
+            return timed("db_writes", attr)
+        if name in DB_READS:
+            return timed("db_reads", attr)
+        return attr
+
+
+def instrument():
+    """Attach stage timers to the services scan_image calls"""
+    from app.api import scan_routes
+    from app.vision.clip_service import vision_service
+    from app.osm.osm_service import osm_service
+    from app.fusion.fusion_service import fusion_service
+    from app.rag.rag_service import rag_service
+    from app.marketplace.marketplace_service import marketplace_service
+    from app.utils.llm_service import llm_service
+    from app.services.bhashini_service import bhashini_service
+    
+    for name in ("prepare_image", "classify_and_encode", "encode_text"):
+        setattr(vision_service, name, timed("vision", getattr(vision_service, name)))
+    for name in ("reverse_geocode", "get_road_difficulty", "find_nearby_recyclers"):
+        setattr(osm_service, name, timed("osm", getattr(osm_service, name)))
+    
+    fusion_service.fuse = timed("fusion", fusion_service.fuse)
+    rag_service.dual_retrieve = timed("rag", rag_service.dual_retrieve)
+    marketplace_service.rank_recyclers = timed("marketplace", marketplace_service.rank_recyclers)
+    llm_service.reason_about_waste = timed("llm", llm_service.reason_about_waste)
+    llm_service.translate_to_english = timed("llm", llm_service.translate_to_english)
+    bhashini_service.translate_with_fallback = timed("translation", bhashini_service.translate_with_fallback)
+    
+    for name in dir(scan_routes):
+        if name.startswith("get_") and name.endswith("_collection"):
+            getter = getattr(scan_routes, name)
+            setattr(scan_routes, name, lambda getter=getter: TimedCollection(getter()))
+
+
+async def connect_mongo(mongo_url: Optional[str]):
+    """Point the shared Database at a scratch database"""
+    db_name = f"renova_bench_{os.getpid()}"
+    
+    if mongo_url:
+        settings.MONGODB_URL = mongo_url
+        settings.MONGODB_DB_NAME = db_name
+        await db.connect_db()
+        return "mongodb"
+    
+    from mongomock_motor import AsyncMongoMockClient
+    
+    db.client = AsyncMongoMockClient()
+    db.db = db.client[db_name]
+    return "mongomock"
+
+
+async def seed(global_docs: int, personal_docs: int, recyclers: int, seed_value: int) -> str:
+    """Insert a user, recyclers and RAG documents with random unit embeddings"""
+    rng = np.random.default_rng(seed_value)
+    
+    def unit_vectors(n):
+        vectors = rng.standard_normal((n, 512)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    
+    await db.db.users.insert_one({"_id": user_id, "name": "Bench User", "total_scans": 0, "created_at": now})
+    await db.db.user_behavior.insert_one({
+        "user_id": user_id,
+        "recent_scans": [],
+        "average_cleanliness_score": 72.0,
+        "total_scans": 0
+    })
+    
+    materials = ["PET", "HDPE", "Paper", "Cardboard", "Glass", "Aluminum", "Steel", "E-Waste", "Textile"]
+    await db.db.recyclers.insert_many([
+        {
+            "name": f"Bench Recycler {i}",
+            "phone": f"90000{i:05d}",
+            "address": f"{i} Bench Street, Bengaluru",
+            "is_active": True,
+            "location": {
+                "type": "Point",
+                "coordinates": [
+                    BENCH_LON + float(rng.uniform(-0.08, 0.08)),
+                    BENCH_LAT + float(rng.uniform(-0.08, 0.08))
+                ]
+            },
+            "materials_accepted": list(rng.choice(materials, size=5, replace=False)),
+            "current_capacity_kg": float(rng.uniform(0, 800)),
+            "max_capacity_kg": 1000.0,
+            "rating": 4.2,
+            "catchment_wards": []
+        }
+        for i in range(recyclers)
+    ])
+    
+    categories = ["disposal", "recycling", "hazard", "regulation"]
+    await db.db.rag_global.insert_many([
+        {
+            "title": f"Guideline {i}",
+            "content": f"Synthetic guideline {i} about waste handling.",
+            "category": categories[i % len(categories)],
+            "tags": [],
+            "city": "Bengaluru" if i % 2 else None,
+            "embedding": encode_embedding(embedding)
+        }
+        for i, embedding in enumerate(unit_vectors(global_docs))
+    ])
+    await db.db.rag_personal.insert_many([
+        {
+            "user_id": user_id,
+            "content": f"Past scan note {i}",
+            "doc_type": "scan_history",
+            "relevance_count": 0,
+            "embedding": encode_embedding(embedding)
+        }
+        for i, embedding in enumerate(unit_vectors(personal_docs))
+    ])
+    
+    return str(user_id)
+
+
+async def run_level(
+    concurrency: int,
+    requests: int,
+    images: List[bytes],
+    user_id: str,
+    language: str,
+    query_text: Optional[str]
+) -> Dict:
+    """Run `requests` scans with at most `concurrency` in flight"""
+    from app.api.scan_routes import scan_image
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[Dict[str, float]] = []
+    errors = 0
+    
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            timings: Dict[str, float] = {}
+            _timings.set(timings)
+            upload = UploadFile(file=io.BytesIO(images[i % len(images)]), filename=f"bench_{i}.jpg")
+            
+            start = time.perf_counter()
+            try:
+                await scan_image(
+                    user_id=user_id,
+                    image=upload,
+                    latitude=BENCH_LAT,
+                    longitude=BENCH_LON,
+                    query_text=query_text,
+                    language=language
+                )
+            except Exception as e:
+                errors += 1
+                print(f"  ✗ request {i} failed: {e}")
+                return
+            timings["total"] = time.perf_counter() - start
+            samples.append(timings)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[asyncio.create_task(one(i)) for i in range(requests)])
+    wall = time.perf_counter() - start
+    
+    stages = {}
+    for stage in STAGES + ["total"]:
+        values = np.array([s.get(stage, 0.0) for s in samples]) * 1000
+        if not len(values):
+            continue
+        stages[stage] = {
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "mean_ms": round(float(values.mean()), 2)
+        }
+    
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 3) if wall > 0 else 0.0,
+        "stages": stages
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def print_level(result: Dict):
+    print(f"\n  concurrency={result['concurrency']}  "
+          f"{result['throughput_rps']:.2f} scans/s  errors={result['errors']}")
+    print(f"  {'stage':<12} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<12} {stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-stage scan pipeline benchmark")
+    parser.add_argument("--requests", type=int, default=64, help="Scans per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--images", type=int, default=32, help="Distinct synthetic images")
+    parser.add_argument("--image-size", default="1600x1200")
+    parser.add_argument("--language", default="hi", help="Output language (hi exercises translation)")
+    parser.add_argument("--query", default=None, help="Optional query_text sent with every scan")
+    parser.add_argument("--osm-ms", type=float, default=150.0, help="Simulated Nominatim/Overpass latency")
+    parser.add_argument("--llm-ms", type=float, default=900.0, help="Simulated Groq latency")
+    parser.add_argument("--translate-ms", type=float, default=250.0, help="Simulated Bhashini latency")
+    parser.add_argument("--global-docs", type=int, default=2000)
+    parser.add_argument("--personal-docs", type=int, default=50)
+    parser.add_argument("--recyclers", type=int, default=30)
+    parser.add_argument("--image-cache", action="store_true", help="Keep the CLIP embedding cache on")
+    parser.add_argument("--mongo-url", default=None, help="Use a real MongoDB instead of mongomock")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args()
+    
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    
+    # Every request should pay for CLIP unless the cache is under test
+    settings.CLIP_CACHE_ENABLED = args.image_cache
+    # ...and for the vector search (no retrieval cache)
+    settings.RETRIEVAL_CACHE_ENABLED = False
+    # Keep synthetic documents out of the server's snapshot directory
+    # (must be set before the vector DBs are created on import)
+    settings.FAISS_SNAPSHOT_DIR = ""
+    
+    from app.vision.clip_service import vision_service
+    from app.rag.rag_service import rag_service
+    from app.services.inference_executor import inference_executor
+    
+    print("=" * 60)
+    print("⏱  Scan pipeline benchmark")
+    print("=" * 60)
+    
+    mongo_backend = await connect_mongo(args.mongo_url)
+    install_stubs(args.osm_ms, args.llm_ms, args.translate_ms, seed=args.seed)
+    
+    try:
+        user_id = await seed(args.global_docs, args.personal_docs, args.recyclers, args.seed)
+        await vision_service.initialize()
+        await rag_service.initialize()
+        instrument()
+        
+        images = synthetic_images(args.images, size=(width, height), seed=args.seed)
+        print(f"  {len(images)} synthetic {width}x{height} images, mongo={mongo_backend}, "
+              f"clip={settings.CLIP_BACKEND}")
+        
+        if args.warmup:
+            await run_level(1, args.warmup, images, user_id, args.language, args.query)
+        
+        runs = []
+        for concurrency in levels:
+            result = await run_level(concurrency, args.requests, images, user_id, args.language, args.query)
+            print_level(result)
+            runs.append(result)
+            
+    finally:
+        await vision_service.shutdown()
+        inference_executor.shutdown()
+        if args.mongo_url:
+            await db.client.drop_database(settings.MONGODB_DB_NAME)
+        await db.close_db()
+    
+    commit = git_commit()
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"scan_pipeline-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "scan_pipeline",
+            "commit": commit,
+            "created_at": datetime.utcnow().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count()
+            },
+            "config": {
+                **{k: v for k, v in vars(args).items() if k != "output"},
+                "mongo": mongo_backend,
+                "clip_model": settings.CLIP_MODEL,
+                "clip_backend": settings.CLIP_BACKEND,
+                "clip_batching": settings.CLIP_BATCHING_ENABLED,
+                "vector_db": settings.VECTOR_DB
+            },
+            "runs": runs
+        }, f, indent=2)
+    
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Vector compression benchmark
+Builds the FAISS index the app would build for each FAISS_VECTOR_CODEC on
+synthetic CLIP-like embeddings and reports memory per million vectors
+(index codes, the in-process vector copy and the Mongo embedding field)
+alongside recall@k against exact float32 search.
+
+Usage:
+    python benchmarks/bench_vector_compression.py [--vectors 100000] [--queries 1000]
+        [--codecs fp32,fp16,sq8] [--index-types flat,hnsw] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+import bson
+import faiss
+
+from app.config import settings
+from app.rag.embedding_codec import encode_embedding
+from app.services.vector_db import FAISSVectorDB
+
+MIB = 1024 * 1024
+
+
+def clip_like(n: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around a few directions, like CLIP embeddings of one domain"""
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, size=n)] + 0.8 * rng.standard_normal((n, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def mongo_bytes(vector: np.ndarray) -> Dict[str, int]:
+    """BSON size of the embedding field as a float list and as BinData"""
+    return {
+        "list": len(bson.encode({"embedding": vector.astype(float).tolist()})),
+        "bindata": len(bson.encode({"embedding": encode_embedding(vector)})),
+    }
+
+
+def run_case(
+    index_type: str,
+    codec: str,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    top_k: int
+) -> Optional[Dict]:
+    # ivf_pq stores PQ codes whatever the codec is
+    if index_type == "ivf_pq" and codec != "fp32":
+        return None
+    
+    vector_db = FAISSVectorDB("bench")
+    vector_db.codec = codec
+    vector_db.store_dtype = np.float32 if codec == "fp32" else np.float16
+    
+    numeric_ids = np.arange(len(vectors), dtype="int64")
+    started = time.perf_counter()
+    index = vector_db._build_index(index_type, numeric_ids, vectors, codec)
+    build_s = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    _, found = index.search(queries, top_k)
+    search_s = time.perf_counter() - started
+    
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    index_bytes = faiss.serialize_index(index).nbytes
+    store_bytes = len(vectors) * vectors.shape[1] * np.dtype(vector_db.store_dtype).itemsize
+    per_million = 1_000_000 / len(vectors)
+    
+    return {
+        "index_type": index_type,
+        "codec": codec,
+        "recall": hits / (len(queries) * top_k),
+        "build_s": build_s,
+        "qps": len(queries) / search_s,
+        "index_mib_per_million": index_bytes * per_million / MIB,
+        "vector_store_mib_per_million": store_bytes * per_million / MIB,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS codec memory / recall benchmark")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--codecs", default="fp32,fp16,sq8", help="Comma-separated FAISS_VECTOR_CODEC values")
+    parser.add_argument("--index-types", default="flat,hnsw", help="Comma-separated FAISS_INDEX_TYPE values")
+    parser.add_argument("--clusters", type=int, default=64, help="Directions the synthetic vectors gather around")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args()
+    
+    codecs = [c.strip() for c in args.codecs.split(",") if c.strip()]
+    index_types = [t.strip() for t in args.index_types.split(",") if t.strip()]
+    
+    print("=" * 60)
+    print("🗜  Vector compression benchmark")
+    print("=" * 60)
+    
+    rng = np.random.default_rng(args.seed)
+    dimension = FAISSVectorDB("bench").dimension
+    vectors = clip_like(args.vectors, dimension, args.clusters, rng)
+    queries = clip_like(args.queries, dimension, args.clusters, rng)
+    
+    # Exact float32 neighbours; inner product ranks unit vectors like L2
+    exact = faiss.IndexFlatIP(dimension)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.top_k)
+    
+    mongo = mongo_bytes(vectors[0])
+    print(f"  {args.vectors} vectors, {args.queries} queries, dim={dimension}, metric={settings.VECTOR_METRIC}")
+    print(f"  Mongo embedding field: list {mongo['list']} B, BinData {mongo['bindata']} B "
+          f"({settings.EMBEDDING_STORAGE_DTYPE}) per document")
+    print(f"\n  {'index':<9}{'codec':<7}{'recall@' + str(args.top_k):>10}{'index MiB/M':>13}"
+          f"{'copy MiB/M':>12}{'qps':>10}{'build s':>9}")
+    
+    runs = []
+    for index_type in index_types:
+        for codec in codecs:
+            result = run_case(index_type, codec, vectors, queries, truth, args.top_k)
+            if result is None:
+                continue
+            runs.append(result)
+            print(f"  {index_type:<9}{codec:<7}{result['recall']:>10.4f}{result['index_mib_per_million']:>13.1f}"
+                  f"{result['vector_store_mib_per_million']:>12.1f}{result['qps']:>10.0f}{result['build_s']:>9.1f}")
+    
+    commit = git_commit()
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"vector_compression-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "vector_compression",
+            "commit": commit,
+            "created_at": datetime.utcnow().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "faiss": faiss.__version__
+            },
+            "config": {
+                **{k: v for k, v in vars(args).items() if k != "output"},
+                "metric": settings.VECTOR_METRIC,
+                "embedding_storage_dtype": settings.EMBEDDING_STORAGE_DTYPE
+            },
+            "mongo_embedding_bytes": {
+                **mongo,
+                "list_mib_per_million": mongo["list"] * 1_000_000 / MIB,
+                "bindata_mib_per_million": mongo["bindata"] * 1_000_000 / MIB
+            },
+            "runs": runs
+        }, f, indent=2)
+    
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Compare two scan pipeline benchmark result files
+
+Usage:
+    python benchmarks/compare.py results/scan_pipeline-<old>.json results/scan_pipeline-<new>.json
+"""
+
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data, {run["concurrency"]: run for run in data["runs"]}
+
+
+def delta(old, new):
+    if not old:
+        return "    n/a"
+    return f"{100 * (new - old) / old:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark JSON files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--percentile", default="p95", choices=["p50", "p95", "p99"])
+    args = parser.parse_args()
+    
+    base, base_runs = load(args.baseline)
+    cand, cand_runs = load(args.candidate)
+    key = f"{args.percentile}_ms"
+    
+    print(f"{base['commit']} -> {cand['commit']} ({args.percentile})")
+    
+    for concurrency in sorted(set(base_runs) & set(cand_runs)):
+        old, new = base_runs[concurrency], cand_runs[concurrency]
+        
+        print(f"\nconcurrency={concurrency}  throughput "
+              f"{old['throughput_rps']:.2f} -> {new['throughput_rps']:.2f} scans/s "
+              f"({delta(old['throughput_rps'], new['throughput_rps'])})")
+        print(f"  {'stage':<12} {'before':>10} {'after':>10} {'change':>8}")
+        
+        for stage, stats in new["stages"].items():
+            before = old["stages"].get(stage, {}).get(key, 0.0)
+            after = stats[key]
+            print(f"  {stage:<12} {before:>8.1f}ms {after:>8.1f}ms {delta(before, after):>8}")
+
+
+if __name__ == "__main__":
+    main()
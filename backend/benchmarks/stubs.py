@@ -0,0 +1,138 @@
+"""
+Local stand-ins for the external services used by the scan pipeline
+(Groq, Nominatim, Overpass, OSRM, Bhashini) and synthetic scan inputs
+"""
+import asyncio
+import io
+import random
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+BENCH_LAT = 12.9716
+BENCH_LON = 77.5946
+
+CANNED_LLM_RESPONSE = """**Disposal Instructions:**
+1. Empty and rinse the item, then drop it in the dry waste bin or take it to a recycler.
+
+**Hazard Notes:**
+2. No special hazards. Keep sharp edges away from children.
+
+**Cleaning Recommendation:**
+3. Rinse with water and let it dry before handing over.
+
+**Recycler Ranking:**
+4. The nearest recycler accepts this material at the standard rate.
+
+**Route Summary:**
+5. About 2 km by road, roughly 10 minutes.
+"""
+
+
+class Latency:
+    """Simulated network latency with seeded uniform jitter"""
+    
+    def __init__(self, ms: float, jitter: float = 0.1, seed: int = 0):
+        self.ms = ms
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+    
+    async def wait(self):
+        if self.ms <= 0:
+            return
+        delay = self.ms * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay / 1000)
+
+
+class FakeGroqClient:
+    """Mimics AsyncGroq.chat.completions.create"""
+    
+    def __init__(self, latency: Latency, content: str = CANNED_LLM_RESPONSE):
+        self.latency = latency
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    async def create(self, **kwargs):
+        await self.latency.wait()
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def install_stubs(osm_ms: float, llm_ms: float, translate_ms: float, seed: int = 0):
+    """Patch the service singletons so no request leaves the process"""
+    from app.osm.osm_service import osm_service
+    from app.utils.llm_service import llm_service
+    from app.services.bhashini_service import bhashini_service
+    
+    nominatim = Latency(osm_ms, seed=seed)
+    overpass = Latency(osm_ms, seed=seed + 1)
+    osrm = Latency(osm_ms / 4, seed=seed + 2)
+    bhashini = Latency(translate_ms, seed=seed + 3)
+    
+    async def reverse_geocode(lat: float, lon: float) -> Dict:
+        await nominatim.wait()
+        return {
+            "address": "MG Road, Shivajinagar, Bengaluru, Karnataka 560001, India",
+            "ward": "Shivajinagar",
+            "pincode": "560001",
+            "locality": "MG Road",
+            "city": "Bengaluru",
+            "state": "Karnataka",
+            "country": "India"
+        }
+    
+    async def find_nearby_recyclers(lat: float, lon: float, radius_m: int = 5000) -> List[Dict]:
+        await overpass.wait()
+        return [
+            {
+                "osm_id": 1000 + i,
+                "lat": lat + 0.01 * i,
+                "lon": lon - 0.01 * i,
+                "name": f"Recycling point {i}",
+                "type": "recycling",
+                "tags": {"amenity": "recycling"}
+            }
+            for i in range(5)
+        ]
+    
+    async def get_road_difficulty(lat: float, lon: float) -> float:
+        await overpass.wait()
+        return 0.9
+    
+    async def get_route(start_lon: float, start_lat: float, end_lon: float, end_lat: float) -> Dict:
+        await osrm.wait()
+        return await osm_service._haversine_route(start_lat, start_lon, end_lat, end_lon)
+    
+    async def translate(text: str, source_language: str = "en", target_language: str = "hi"):
+        await bhashini.wait()
+        return f"[{target_language}] {text}"
+    
+    osm_service.reverse_geocode = reverse_geocode
+    osm_service.find_nearby_recyclers = find_nearby_recyclers
+    osm_service.get_road_difficulty = get_road_difficulty
+    osm_service.get_route = get_route
+    llm_service.client = FakeGroqClient(Latency(llm_ms, seed=seed + 4))
+    bhashini_service.translate = translate
+
+
+def synthetic_images(count: int, size=(1600, 1200), seed: int = 0) -> List[bytes]:
+    """Phone-sized JPEGs: smooth colour fields plus noise, distinct per image"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    images = []
+    
+    for _ in range(count):
+        coarse = rng.integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        image = Image.fromarray(coarse).resize((width, height), Image.BILINEAR)
+        
+        pixels = np.asarray(image, dtype=np.int16)
+        pixels += rng.integers(-12, 13, size=pixels.shape, dtype=np.int16)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=85)
+        images.append(buf.getvalue())
+    
+    return images
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+CLIP backend parity check
+Compares mapped material predictions of the ONNX int8 backend against the
+PyTorch backend on a folder of real photos (tests/fixtures/clip_parity by
+default; tests/test_clip_parity.py runs the same check under pytest)
+
+Usage:
+    python scripts/check_clip_parity.py [image_dir] [--min-agreement 0.9]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.vision.clip_service import VisionService
+from app.vision.preprocessing import prepare_image
+
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "clip_parity")
+
+
+def load_images(image_dir):
+    """Read every image in image_dir as (name, bytes)"""
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+            with open(os.path.join(image_dir, name), "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+def classify_all(backend_name, images):
+    """Run zero-shot material classification with one backend"""
+    service = VisionService()
+    
+    start = time.perf_counter()
+    service._load_model(backend_name)
+    load_time = time.perf_counter() - start
+    
+    labels = []
+    start = time.perf_counter()
+    for _, image_bytes in images:
+        prepared = prepare_image(image_bytes, service.processor)
+        embedding = service._encode_image_batch([prepared.pixel_values])[0]
+        prediction = service._predict_from_embedding(embedding)
+        labels.append(prediction["material"])
+    per_image = (time.perf_counter() - start) / max(len(images), 1)
+    
+    return labels, load_time, per_image
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ONNX/torch CLIP parity")
+    parser.add_argument("image_dir", nargs="?", default=DEFAULT_IMAGE_DIR)
+    parser.add_argument("--min-agreement", type=float, default=0.9)
+    args = parser.parse_args()
+    
+    images = load_images(args.image_dir) if os.path.isdir(args.image_dir) else []
+    if not images:
+        print(f"❌ No images in {args.image_dir} - parity needs real photos")
+        sys.exit(1)
+    
+    print("=" * 60)
+    print(f"🔍 CLIP backend parity on {len(images)} images")
+    print("=" * 60)
+    
+    torch_labels, torch_load, torch_ms = classify_all("torch", images)
+    onnx_labels, onnx_load, onnx_ms = classify_all("onnx", images)
+    
+    agree = 0
+    for (name, _), t, o in zip(images, torch_labels, onnx_labels):
+        match = t == o
+        agree += match
+        if not match:
+            print(f"  ✗ {name}: torch={t!r} onnx={o!r}")
+    
+    agreement = agree / max(len(images), 1)
+    
+    print(f"\n  torch: load {torch_load:.1f}s, {1000 * torch_ms:.1f} ms/image")
+    print(f"  onnx:  load {onnx_load:.1f}s, {1000 * onnx_ms:.1f} ms/image")
+    print(f"  top-1 material agreement: {agreement:.1%} (min {args.min_agreement:.0%})")
+    
+    if agreement < args.min_agreement:
+        print("❌ Parity check failed")
+        sys.exit(1)
+    
+    print("✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -114,20 +114,22 @@ async def seed_global_rag():
     # Initialize CLIP service to generate actual embeddings
     print("🔧 Initializing CLIP service for embeddings...")
     from app.vision.clip_service import vision_service
+    from app.rag.embedding_codec import encode_embedding
     await vision_service.initialize()
     
     # Generate embeddings (512-dim for CLIP ViT-B/32 compatibility)
     embeddings_list = []
     doc_ids = []
     
+    # Generate ACTUAL CLIP text embeddings in bulk (one forward pass per chunk)
+    # Truncate content to avoid CLIP's 77 token limit (~300 chars is safe)
+    texts_for_embedding = [doc['content'][:250] for doc in GLOBAL_RAG_SAMPLES]
+    print(f"  Encoding {len(texts_for_embedding)} documents...")
+    embeddings_array = await vision_service.encode_texts(texts_for_embedding)
+    
     for i, doc in enumerate(GLOBAL_RAG_SAMPLES):
-        # Generate ACTUAL CLIP text embedding
-        # Truncate content to avoid CLIP's 77 token limit (~300 chars is safe)
-        text_for_embedding = doc['content'][:250]
-        doc_preview = doc['content'][:50].split('.')[0]  # Get first sentence
-        print(f"  Encoding document {i+1}/{len(GLOBAL_RAG_SAMPLES)}: {doc_preview}...")
-        embedding = await vision_service.encode_text(text_for_embedding)
-        doc["embedding"] = embedding.tolist()
+        embedding = embeddings_array[i]
+        doc["embedding"] = encode_embedding(embedding)
         doc["created_at"] = datetime.utcnow()
         embeddings_list.append(embedding)
     
@@ -161,6 +163,7 @@ async def seed_global_rag():
         embeddings=embeddings_array,
         metadata=[{"title": doc.get("content", "")[:50], "category": doc.get("metadata", {}).get("category", "")} for doc in GLOBAL_RAG_SAMPLES]
     )
+    await global_rag_vector_db.flush()
     print(f"✅ Populated FAISS index with {len(doc_ids)} vectors")
     
     client.close()
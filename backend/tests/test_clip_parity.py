@@ -0,0 +1,71 @@
+"""
+CLIP backend parity: the ONNX int8 towers must pick the same material as
+PyTorch on real sample photos (tests/fixtures/clip_parity, or the folder
+in CLIP_PARITY_IMAGE_DIR)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+
+from app.config import settings
+
+IMAGE_DIR = os.environ.get(
+    "CLIP_PARITY_IMAGE_DIR",
+    os.path.join(os.path.dirname(__file__), "fixtures", "clip_parity")
+)
+MIN_AGREEMENT = 0.9
+
+HAS_PHOTOS = os.path.isdir(IMAGE_DIR) and any(
+    name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")) for name in os.listdir(IMAGE_DIR)
+)
+
+
+def test_parity_photos_present():
+    """Without photos the parity check below can't run - never pass quietly"""
+    if HAS_PHOTOS:
+        return
+    
+    message = f"No sample photos in {IMAGE_DIR}: ONNX int8 vs PyTorch material parity is UNCHECKED"
+    if settings.CLIP_BACKEND.lower() == "onnx":
+        pytest.fail(f"{message}, but CLIP_BACKEND=onnx is configured")
+    pytest.xfail(message)
+
+
+def weights_available() -> bool:
+    """Both backends start from the PyTorch checkpoint; never download it in tests"""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    return any(
+        isinstance(try_to_load_from_cache(settings.CLIP_MODEL, filename), str)
+        for filename in ("model.safetensors", "pytorch_model.bin")
+    )
+
+
+@pytest.mark.skipif(not HAS_PHOTOS, reason="no sample photos (reported by test_parity_photos_present)")
+@pytest.mark.skipif(not weights_available(), reason="CLIP weights not in the local cache")
+def test_onnx_matches_torch_material():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from scripts.check_clip_parity import classify_all, load_images
+    
+    images = load_images(IMAGE_DIR)
+    torch_materials, _, _ = classify_all("torch", images)
+    onnx_materials, _, _ = classify_all("onnx", images)
+    
+    mismatches = [
+        f"{name}: torch={t!r} onnx={o!r}"
+        for (name, _), t, o in zip(images, torch_materials, onnx_materials)
+        if t != o
+    ]
+    agreement = 1 - len(mismatches) / len(images)
+    
+    assert agreement >= MIN_AGREEMENT, "\n".join(mismatches)